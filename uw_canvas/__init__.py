@@ -7,14 +7,27 @@ This is the interface for interacting with Instructure's Canvas web services.
 """
 
 from commonconf import settings
+from concurrent.futures import ThreadPoolExecutor, Future
+from copy import deepcopy
+from functools import partial, wraps
+from queue import Queue, Full
+from threading import Thread, Event, Lock
+from importlib import import_module
 from urllib.parse import quote
 import warnings
+import weakref
+import asyncio
 import json
 import re
 from restclients_core.exceptions import DataFailureException
 from uw_canvas.dao import Canvas_DAO
+from uw_canvas.cache import LRUCache
 
 DEFAULT_PAGINATION = 0
+DEFAULT_PAGE_WORKERS = 1
+DEFAULT_PREFETCH_PAGES = 0
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_BATCH_WORKERS = 10
 MASQUERADING_USER = None
 
 
@@ -33,17 +46,31 @@ class Canvas(object):
     about accounts, courses, enrollments and users within
     Canvas
     """
+    _etag_cache = None
+    _etag_cache_lock = Lock()
+    _response_cache = None
+    _response_cache_lock = Lock()
+    _in_flight = {}
+    _in_flight_lock = Lock()
 
     def __init__(self,
                  per_page=DEFAULT_PAGINATION,
                  as_user=MASQUERADING_USER,
-                 canvas_api_host=None):
+                 canvas_api_host=None,
+                 page_workers=DEFAULT_PAGE_WORKERS,
+                 prefetch_pages=DEFAULT_PREFETCH_PAGES):
         """
-        Prepares for paginated responses
+        Prepares for paginated responses.  When page_workers is greater
+        than one, numbered pages are fetched concurrently.  When
+        prefetch_pages is greater than zero, up to that many following
+        pages are fetched on a background thread ahead of the caller.
         """
         self._per_page = per_page
+        self._page_workers = page_workers
+        self._prefetch_pages = prefetch_pages
         self._as_user = as_user
         self._re_canvas_id = re.compile(r'^\d{2,12}$')
+        self._re_page_number = re.compile(r'([?&]page=)(\d+)(?=&|$)')
         self._canvas_account_id = getattr(
             settings, 'RESTCLIENTS_CANVAS_ACCOUNT_ID', None)
         self._DAO = Canvas_DAO(canvas_api_host=canvas_api_host)
@@ -105,40 +132,251 @@ class Canvas(object):
         """
         return url path to next page of paginated data
         """
+        return self._page_link(response, "next")
+
+    def _page_link(self, response, rel_name):
+        """
+        return url path for the named pagination link
+        """
         for link in response.getheader("link", "").split(","):
             try:
                 (url, rel) = link.split(";")
-                if "next" in rel:
-                    return url.lstrip("<").rstrip(">")
+                if rel_name in rel:
+                    return url.strip().lstrip("<").rstrip(">")
             except Exception:
                 return
 
-    def _get_resource_url(self, url, auto_page, data_key):
+    def _page_number(self, url):
+        match = self._re_page_number.search(url or "")
+        return int(match.group(2)) if match is not None else None
+
+    def _page_range(self, response):
         """
-        Canvas GET method on a full url. Return representation of the
-        requested resource, chasing pagination links to coalesce resources
-        if indicated.
+        return url paths for all remaining pages of paginated data, if the
+        response links to numbered next and last pages
+        """
+        last_url = self._page_link(response, "last")
+        next_page = self._page_number(self._next_page(response))
+        last_page = self._page_number(last_url)
+
+        if next_page is None or last_page is None:
+            return []
+
+        return [self._re_page_number.sub(r"\g<1>{}".format(page), last_url)
+                for page in range(next_page, last_page + 1)]
+
+    def _get_etag_cache(self):
+        """
+        Return the shared ETag validator cache, if enabled by the
+        RESTCLIENTS_CANVAS_ETAG_CACHE_SIZE setting.
         """
+        size = int(getattr(settings, 'RESTCLIENTS_CANVAS_ETAG_CACHE_SIZE', 0))
+        if size <= 0:
+            return None
+
+        with Canvas._etag_cache_lock:
+            if (Canvas._etag_cache is None or
+                    Canvas._etag_cache.maxsize != size):
+                Canvas._etag_cache = LRUCache(maxsize=size)
+            return Canvas._etag_cache
+
+    def _get_response_cache(self):
+        """
+        Return the shared response cache, an instance of the class named
+        by the RESTCLIENTS_CANVAS_CACHE_CLASS setting, if set.
+        """
+        class_path = getattr(settings, 'RESTCLIENTS_CANVAS_CACHE_CLASS', None)
+        if not class_path:
+            return None
+
+        with Canvas._response_cache_lock:
+            cache = Canvas._response_cache
+            if cache is None or "{}.{}".format(
+                    cache.__class__.__module__,
+                    cache.__class__.__name__) != class_path:
+                module_name, class_name = class_path.rsplit(".", 1)
+                cache_class = getattr(import_module(module_name), class_name)
+                Canvas._response_cache = cache = cache_class()
+            return cache
+
+    def _invalidate_cache(self, url):
+        cache = self._get_response_cache()
+        if cache is not None:
+            cache.invalidate(self._DAO.get_service_setting("HOST"), url)
+
+    def _get_response(self, url):
+        """
+        Canvas GET method on a full url. Return the response for the
+        requested resource, raising DataFailureException on error.
+        Concurrent requests for the same url share a single request.
+        """
+        key = (self._DAO.get_service_setting("HOST"), url)
+        with Canvas._in_flight_lock:
+            in_flight = Canvas._in_flight.get(key)
+            if in_flight is None:
+                Canvas._in_flight[key] = future = Future()
+
+        if in_flight is not None:
+            return in_flight.result()
+
+        try:
+            response = self._fetch_response(url)
+            future.set_result(response)
+            return response
+        except BaseException as ex:
+            future.set_exception(ex)
+            raise
+        finally:
+            with Canvas._in_flight_lock:
+                del Canvas._in_flight[key]
+
+    def _fetch_response(self, url):
+        """
+        Return the response for the url from the response cache or from
+        Canvas.  Responses carrying an ETag are revalidated with
+        If-None-Match when the ETag cache is enabled.
+        """
+        response_cache = self._get_response_cache()
+        if response_cache is not None:
+            host = self._DAO.get_service_setting("HOST")
+            credential = self._DAO.get_service_setting("OAUTH_BEARER")
+            response = response_cache.get(host, url, credential)
+            if response is not None:
+                return response
+
         headers = {'Accept': 'application/json',
                    'Connection': 'keep-alive'}
+
+        etag_cache = self._get_etag_cache()
+        if etag_cache is not None:
+            cache_key = (self._DAO.get_service_setting("HOST"), url)
+            cached = etag_cache.get(cache_key)
+            if cached is not None:
+                headers['If-None-Match'] = cached.getheader("ETag")
+
         response = self._DAO.getURL(url, headers)
 
+        if etag_cache is not None:
+            if response.status == 304 and cached is not None:
+                return cached
+            if response.status == 200 and response.getheader("ETag"):
+                etag_cache.set(cache_key, response)
+
         if response.status != 200:
             raise DataFailureException(url, response.status, response.data)
 
+        if response_cache is not None:
+            response_cache.set(host, url, response, credential)
+
+        return response
+
+    def _get_page_data(self, url):
+        return json.loads(self._get_response(url).data)
+
+    def _extend_page_data(self, data, page_data, data_key):
+        if isinstance(data, list):
+            data.extend(page_data)
+        else:
+            data[data_key].extend(page_data[data_key])
+
+    def _get_resource_url(self, url, auto_page, data_key):
+        """
+        Canvas GET method on a full url. Return representation of the
+        requested resource, chasing pagination links to coalesce resources
+        if indicated.
+        """
+        response = self._get_response(url)
         data = json.loads(response.data)
 
         self.next_page_url = self._next_page(response)
-        if auto_page and self.next_page_url:
-            if isinstance(data, list):
-                data.extend(self._get_resource_url(self.next_page_url, True,
-                                                   data_key))
-            elif isinstance(data, dict) and data_key is not None:
-                data[data_key].extend(self._get_resource_url(
-                    self.next_page_url, True, data_key)[data_key])
+        if not (auto_page and (isinstance(data, list) or (
+                isinstance(data, dict) and data_key is not None))):
+            return data
+
+        page_urls = self._page_range(response) if (
+            self.next_page_url and self._page_workers > 1) else []
+        if len(page_urls):
+            with ThreadPoolExecutor(max_workers=self._page_workers) as pool:
+                for page_data in pool.map(self._get_page_data, page_urls):
+                    self._extend_page_data(data, page_data, data_key)
+            self.next_page_url = None
+
+        if self.next_page_url:
+            for response in self._iter_responses(self.next_page_url, True):
+                self._extend_page_data(
+                    data, json.loads(response.data), data_key)
+            self.next_page_url = None
 
         return data
 
+    def _iter_responses(self, url, auto_page):
+        """
+        Yield the response for url, and for each following page if
+        auto_page, prefetching pages in the background if configured.
+        """
+        if self._prefetch_pages > 0:
+            yield from self._iter_prefetched_responses(url, auto_page)
+            return
+
+        while url is not None:
+            response = self._get_response(url)
+            url = self._next_page(response) if auto_page else None
+            yield response
+
+    def _iter_prefetched_responses(self, url, auto_page):
+        """
+        Yield responses fetched by a background thread, which requests
+        each following page as soon as the previous response arrives,
+        staying at most prefetch_pages ahead of the caller.
+        """
+        responses = Queue(maxsize=self._prefetch_pages)
+        stopped = Event()
+
+        def enqueue(item):
+            while not stopped.is_set():
+                try:
+                    responses.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def fetch(url):
+            try:
+                while url is not None and not stopped.is_set():
+                    response = self._get_response(url)
+                    url = self._next_page(response) if auto_page else None
+                    enqueue(response)
+            except Exception as ex:
+                enqueue(ex)
+            enqueue(None)
+
+        Thread(target=fetch, args=(url,), daemon=True).start()
+        try:
+            while True:
+                response = responses.get()
+                if response is None:
+                    return
+                if isinstance(response, Exception):
+                    raise response
+                yield response
+        finally:
+            stopped.set()
+
+    def _iter_resource_url(self, url, auto_page, data_key):
+        """
+        Canvas GET method on a full url. Yield the items of the requested
+        resource one page at a time, fetching each following page when the
+        previous one has been consumed, or ahead of it if prefetching.
+        """
+        for response in self._iter_responses(url, auto_page):
+            data = json.loads(response.data)
+
+            if data_key is not None:
+                data = data.get(data_key, [])
+
+            for datum in data:
+                yield datum
+
     def _set_as_user(self, params):
         if ('as_user_id' not in params and self._as_user is not None):
             if self.valid_canvas_id(self._as_user):
@@ -166,6 +404,26 @@ class Canvas(object):
         full_url = url + self._params(params)
         return self._get_resource_url(full_url, auto_page, data_key)
 
+    def _iter_paged_resource(self, url, params=None, data_key=None):
+        """
+        Canvas GET method. Return an iterator over the items of the
+        requested paged resource, either the requested page, or all pages
+        following pagination links as the iterator is consumed.  As with
+        _get_paged_resource, passing page or per_page requests one page.
+        """
+        if not params:
+            params = {}
+
+        self._set_as_user(params)
+
+        auto_page = not ('page' in params or 'per_page' in params)
+
+        if 'per_page' not in params and self._per_page != DEFAULT_PAGINATION:
+            params["per_page"] = self._per_page
+
+        full_url = url + self._params(params)
+        return self._iter_resource_url(full_url, auto_page, data_key)
+
     def _get_resource(self, url, params=None, data_key=None):
         """
         Canvas GET method. Return representation of the requested resource.
@@ -179,9 +437,31 @@ class Canvas(object):
 
         return self._get_resource_url(full_url, True, data_key)
 
-    def _put_resource(self, url, body={}):
+    def _get_batch(self, method, ids, params=None,
+                   max_workers=DEFAULT_BATCH_WORKERS):
         """
-        Canvas PUT method.
+        Call method for each distinct id on a bounded thread pool, and
+        return the results in the order of ids.  A DataFailureException
+        raised for an id is returned in place of its result.
+        """
+        def get(item_id):
+            try:
+                if params is None:
+                    return method(item_id)
+                return method(item_id, deepcopy(params))
+            except DataFailureException as ex:
+                return ex
+
+        unique_ids = list(dict.fromkeys(ids))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = dict(zip(unique_ids, pool.map(get, unique_ids)))
+
+        return [results[item_id] for item_id in ids]
+
+    def _put_resource(self, url, body={}, retry=False):
+        """
+        Canvas PUT method.  Pass retry=True for idempotent updates that
+        are safe to retry after a throttled or transient failure.
         """
         params = {}
         self._set_as_user(params)
@@ -189,12 +469,14 @@ class Canvas(object):
                    'Accept': 'application/json',
                    'Connection': 'keep-alive'}
         url = url + self._params(params)
-        response = self._DAO.putURL(url, headers, json.dumps(body))
+        response = self._DAO.putURL(url, headers, json.dumps(body),
+                                    retry=retry)
 
         if not (response.status == 200 or response.status == 201 or
                 response.status == 204):
             raise DataFailureException(url, response.status, response.data)
 
+        self._invalidate_cache(url)
         return json.loads(response.data)
 
     def _post_resource(self, url, body):
@@ -212,6 +494,7 @@ class Canvas(object):
         if not (response.status == 200 or response.status == 204):
             raise DataFailureException(url, response.status, response.data)
 
+        self._invalidate_cache(url)
         return json.loads(response.data)
 
     def _delete_resource(self, url, params={}):
@@ -227,4 +510,72 @@ class Canvas(object):
         if not (response.status == 200 or response.status == 204):
             raise DataFailureException(url, response.status, response.data)
 
+        self._invalidate_cache(url)
         return response
+
+
+class AsyncCanvas(Canvas):
+    """
+    The AsyncCanvas object provides coroutine versions of the Canvas
+    request methods, for use from an asyncio event loop.  Requests are
+    made through the Canvas DAO on an executor of max_concurrency threads
+    per instance.  Resource subclasses run the methods of their
+    synchronous _sync_class on the same executor.
+    """
+    _sync_class = Canvas
+
+    def __init__(self, *args, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sync = self._sync_class(*args, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        weakref.finalize(self, self._executor.shutdown, wait=False)
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(method, *args, **kwargs))
+
+    async def _get_paged_resource(self, url, params=None, data_key=None):
+        """
+        Canvas GET method. Return representation of the requested paged
+        resource, either the requested page, or chase pagination links to
+        coalesce resources.
+        """
+        return await self._run(
+            super()._get_paged_resource, url, params, data_key)
+
+    async def _get_resource(self, url, params=None, data_key=None):
+        """
+        Canvas GET method. Return representation of the requested resource.
+        """
+        return await self._run(super()._get_resource, url, params, data_key)
+
+    async def _put_resource(self, url, body={}, retry=False):
+        """
+        Canvas PUT method.
+        """
+        return await self._run(super()._put_resource, url, body, retry)
+
+    async def _post_resource(self, url, body):
+        """
+        Canvas POST method.
+        """
+        return await self._run(super()._post_resource, url, body)
+
+    async def _delete_resource(self, url, params={}):
+        """
+        Canvas DELETE method.
+        """
+        return await self._run(super()._delete_resource, url, params)
+
+
+def async_method(method):
+    """
+    Returns a coroutine version of a synchronous resource method, for an
+    AsyncCanvas subclass, that calls it on the instance's executor.
+    """
+    @wraps(method)
+    async def run(self, *args, **kwargs):
+        return await self._run(method, self._sync, *args, **kwargs)
+    return run
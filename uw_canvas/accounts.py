@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas
+from uw_canvas import Canvas, AsyncCanvas, async_method
 from uw_canvas.models import CanvasAccount, CanvasSSOSettings
 
 ACCOUNTS_API = "/api/v1/accounts/{}"
@@ -104,3 +104,18 @@ class Accounts(Canvas):
         url = ACCOUNTS_API.format(account_id) + "/sso_settings"
         body = {"sso_settings": auth_settings.json_data()}
         return CanvasSSOSettings(data=self._put_resource(url, body))
+
+
+class AsyncAccounts(AsyncCanvas):
+    """
+    Coroutine versions of the Accounts methods.
+    """
+    _sync_class = Accounts
+
+    get_account = async_method(Accounts.get_account)
+    get_account_by_sis_id = async_method(Accounts.get_account_by_sis_id)
+    get_sub_accounts = async_method(Accounts.get_sub_accounts)
+    get_sub_accounts_by_sis_id = async_method(
+        Accounts.get_sub_accounts_by_sis_id)
+    get_all_sub_accounts = async_method(Accounts.get_all_sub_accounts)
+    update_account = async_method(Accounts.update_account)
@@ -0,0 +1,344 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Contains in-process caches used by the Canvas client.
+"""
+from commonconf import settings
+from restclients_core.models import MockHTTP
+from collections import OrderedDict
+from threading import Lock, local
+from hashlib import sha256
+import logging
+import sqlite3
+import json
+import time
+import os
+import re
+
+# Default time-to-live, in seconds, for slow-changing Canvas resources,
+# keyed by a regular expression matched against the request path.
+# Developer keys are left out since their responses contain API secrets.
+DEFAULT_CACHE_TTLS = {
+    r'^/api/v1/accounts/[^/]+$': 3600,
+    r'^/api/v1/accounts/[^/]+/terms': 3600,
+    r'^/api/v1/accounts/[^/]+/roles': 3600,
+    r'/grading_standards': 3600,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most maxsize entries, evicting the
+    least recently used entry when full.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose entries expire after a per-entry time-to-live, and
+    which also evicts entries to stay within max_bytes, given the size of
+    each entry.
+    """
+    def __init__(self, maxsize=128, max_bytes=None):
+        super().__init__(maxsize=maxsize)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < time.time():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl, size=0):
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, time.time() + ttl, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and
+                    self.bytes > self.max_bytes and len(self._data)):
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+
+class ResponseCache(object):
+    """
+    An in-process cache of Canvas GET responses, for the request paths
+    given a time-to-live by RESTCLIENTS_CANVAS_CACHE_TTLS.  Responses are
+    cached by host, url and a fingerprint of the credential used to fetch
+    them, and are invalidated for every credential by a PUT, POST or
+    DELETE to a related path.
+    """
+    def __init__(self):
+        ttls = getattr(settings, 'RESTCLIENTS_CANVAS_CACHE_TTLS',
+                       DEFAULT_CACHE_TTLS)
+        self._ttls = [(re.compile(pattern), int(ttl))
+                      for pattern, ttl in ttls.items()]
+        self.maxsize = int(getattr(
+            settings, 'RESTCLIENTS_CANVAS_CACHE_SIZE', 1000))
+        self.max_bytes = int(getattr(
+            settings, 'RESTCLIENTS_CANVAS_CACHE_MAX_BYTES', 50000000))
+        self._cache = self._create_store()
+
+    def _create_store(self):
+        return TTLCache(maxsize=self.maxsize, max_bytes=self.max_bytes)
+
+    @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    def ttl(self, url):
+        """
+        Return the time-to-live for the url, or None if not cacheable.
+        """
+        path = url.split("?")[0]
+        for pattern, ttl in self._ttls:
+            if pattern.search(path):
+                return ttl
+
+    def get(self, host, url, credential=None):
+        if self.ttl(url) is None:
+            return None
+        return self._cache.get(self._key(host, url, credential))
+
+    def set(self, host, url, response, credential=None):
+        ttl = self.ttl(url)
+        if ttl is not None:
+            self._cache.set(self._key(host, url, credential), response, ttl,
+                            size=len(response.data or ""))
+
+    def invalidate(self, host, url):
+        """
+        Remove cached responses for the url path, its sub-resources, and
+        the resources containing it.
+        """
+        prefix = _key_path("{}{}".format(host or "", url))
+        for key in self._cache.keys():
+            if _is_related_path(_key_path(key.split(" ", 1)[1]), prefix):
+                self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def _key(self, host, url, credential=None):
+        fingerprint = sha256(credential.encode("utf-8")).hexdigest()[:32] if (
+            credential) else "-"
+        return "{} {}{}".format(fingerprint, host or "", url)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    A ResponseCache stored in the SQLite database file named by the
+    RESTCLIENTS_CANVAS_CACHE_PATH setting, shared by every process using
+    the same file.  By default the file is in a per-user cache directory.
+    The file is created readable only by its owner.  SQLite errors, such
+    as a locked database, are logged and treated as cache misses.
+    """
+    def _create_store(self):
+        self.path = getattr(settings, 'RESTCLIENTS_CANVAS_CACHE_PATH', None)
+        if not self.path:
+            self.path = os.path.join(_user_cache_dir(),
+                                     "uw_canvas_cache.sqlite3")
+        self._local = local()
+        self._stats_lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response ("
+                    "key TEXT PRIMARY KEY, status INTEGER, headers TEXT, "
+                    "data BLOB, size INTEGER, expires REAL, accessed REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS response_accessed "
+                             "ON response (accessed)")
+        except sqlite3.Error as ex:
+            logger.warning("Response cache {}: {}".format(self.path, ex))
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def get(self, host, url, credential=None):
+        if self.ttl(url) is None:
+            return None
+
+        key = self._key(host, url, credential)
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT status, headers, data FROM response "
+                    "WHERE key = ? AND expires > ?", (key, now)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE response SET accessed = ? "
+                                 "WHERE key = ?", (now, key))
+        except sqlite3.Error as ex:
+            logger.warning("Response cache {}: {}".format(self.path, ex))
+            row = None
+
+        with self._stats_lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+
+        response = MockHTTP()
+        response.status = row[0]
+        response.headers = json.loads(row[1])
+        response.data = row[2]
+        return response
+
+    def set(self, host, url, response, credential=None):
+        ttl = self.ttl(url)
+        if ttl is None:
+            return
+
+        try:
+            self._set(self._key(host, url, credential), response, ttl)
+        except sqlite3.Error as ex:
+            logger.warning("Response cache {}: {}".format(self.path, ex))
+
+    def _set(self, key, response, ttl):
+        data = response.data or ""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status,
+                 json.dumps(dict(response.headers or {})), data,
+                 len(data), now + ttl, now))
+            conn.execute("DELETE FROM response WHERE expires <= ?", (now,))
+            conn.execute(
+                "DELETE FROM response WHERE key IN (SELECT key FROM response "
+                "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+
+            total = conn.execute(
+                "SELECT SUM(size) FROM response").fetchone()[0] or 0
+            while total > self.max_bytes:
+                row = conn.execute(
+                    "SELECT key, size FROM response "
+                    "ORDER BY accessed LIMIT 1").fetchone()
+                conn.execute("DELETE FROM response WHERE key = ?", (row[0],))
+                total -= row[1]
+
+    def invalidate(self, host, url):
+        prefix = _key_path("{}{}".format(host or "", url))
+        try:
+            with self._connection() as conn:
+                keys = [row[0] for row in conn.execute(
+                    "SELECT key FROM response WHERE key LIKE ?",
+                    ("% {}%".format(host or ""),))]
+                conn.executemany("DELETE FROM response WHERE key = ?", [
+                    (key,) for key in keys if _is_related_path(
+                        _key_path(key.split(" ", 1)[1]), prefix)])
+        except sqlite3.Error as ex:
+            logger.warning("Response cache {}: {}".format(self.path, ex))
+
+    def clear(self):
+        try:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM response")
+        except sqlite3.Error as ex:
+            logger.warning("Response cache {}: {}".format(self.path, ex))
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+def _user_cache_dir():
+    """
+    Returns the uw_canvas directory in the user's cache directory,
+    creating it accessible only to the user.
+    """
+    path = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"), "uw_canvas")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def _key_path(url):
+    return url.split("?")[0].rstrip("/")
+
+
+def _is_related_path(path, other):
+    return (path == other or path.startswith(other + "/") or
+            other.startswith(path + "/"))
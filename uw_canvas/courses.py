@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas
+from uw_canvas import Canvas, AsyncCanvas, async_method, DEFAULT_BATCH_WORKERS
 from uw_canvas.accounts import ACCOUNTS_API
 from uw_canvas.models import CanvasCourse
 
@@ -31,6 +31,24 @@ class Courses(Canvas):
         return self.get_course(self._sis_id(sis_course_id, sis_field="course"),
                                params)
 
+    def get_courses(self, course_ids, params={},
+                    max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Return a list of course resources for the passed canvas course ids,
+        in the same order.  A DataFailureException for a course is returned
+        in place of that course.
+        """
+        return self._get_batch(self.get_course, course_ids, params,
+                               max_workers=max_workers)
+
+    def get_courses_by_sis_ids(self, sis_course_ids, params={},
+                               max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Return a list of course resources for the passed sis ids.
+        """
+        return self._get_batch(self.get_course_by_sis_id, sis_course_ids,
+                               params, max_workers=max_workers)
+
     def get_courses_in_account(self, account_id, params={}):
         """
         Returns a list of courses for the passed account ID.
@@ -54,6 +72,28 @@ class Courses(Canvas):
         return self.get_courses_in_account(
             self._sis_id(sis_account_id, sis_field="account"), params)
 
+    def iter_courses_in_account(self, account_id, params={}):
+        """
+        Return an iterator over the courses for the passed account ID,
+        fetching pages as they are consumed.
+
+        https://canvas.instructure.com/doc/api/accounts.html#method.accounts.courses_api
+        """
+        if "published" in params:
+            params["published"] = "true" if params["published"] else ""
+
+        url = ACCOUNTS_API.format(account_id) + "/courses"
+
+        for data in self._iter_paged_resource(url, params=params):
+            yield CanvasCourse(data=data)
+
+    def iter_courses_in_account_by_sis_id(self, sis_account_id, params={}):
+        """
+        Return an iterator over the courses for the passed account SIS ID.
+        """
+        return self.iter_courses_in_account(
+            self._sis_id(sis_account_id, sis_field="account"), params)
+
     def get_published_courses_in_account(self, account_id, params={}):
         """
         Return a list of published courses for the passed account ID.
@@ -175,3 +215,23 @@ class Courses(Canvas):
         if course is None:
             return None
         return self.unpublish_course(course.course_id)
+
+
+class AsyncCourses(AsyncCanvas):
+    """
+    Coroutine versions of the Courses methods.
+    """
+    _sync_class = Courses
+
+    get_course = async_method(Courses.get_course)
+    get_course_by_sis_id = async_method(Courses.get_course_by_sis_id)
+    get_courses_in_account = async_method(Courses.get_courses_in_account)
+    get_courses_in_account_by_sis_id = async_method(
+        Courses.get_courses_in_account_by_sis_id)
+    get_published_courses_in_account = async_method(
+        Courses.get_published_courses_in_account)
+    create_course = async_method(Courses.create_course)
+    update_sis_id = async_method(Courses.update_sis_id)
+    delete_course = async_method(Courses.delete_course)
+    publish_course = async_method(Courses.publish_course)
+    unpublish_course = async_method(Courses.unpublish_course)
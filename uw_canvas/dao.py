@@ -6,20 +6,200 @@
 Contains Canvas DAO implementations.
 """
 from restclients_core.dao import DAO, LiveDAO
+from restclients_core.exceptions import DataFailureException
 from commonconf import settings
 from urllib3 import PoolManager
 from urllib3.util.retry import Retry
+from prometheus_client import Counter
 from os.path import abspath, dirname
 from importlib.metadata import version
+from threading import Condition, Lock
+import random
+import time
 import os
 import re
 
+RETRY_STATUS_CODES = [502, 503, 504]
+
+prometheus_retry = Counter('restclient_canvas_request_retry',
+                           'Canvas request retry count, by response status',
+                           ['service', 'status'])
+
+
+class CanvasThrottle(object):
+    """
+    Tracks the Canvas rate limit bucket, reported by the
+    X-Rate-Limit-Remaining and X-Request-Cost response headers, across
+    threads.  The number of requests allowed in flight is halved when the
+    bucket falls below the threshold or a request is throttled, and grows
+    by one while the bucket stays above it.  Requests made while the
+    bucket is low are delayed in proportion to how far below the
+    threshold it is.
+    """
+    def __init__(self, max_concurrency=10, threshold=300, max_delay=1.0):
+        self.max_concurrency = max_concurrency
+        self.threshold = threshold
+        self.max_delay = max_delay
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.remaining = None
+        self.request_cost = None
+        self.throttled_count = 0
+        self.delay_count = 0
+        self._condition = Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.concurrency:
+                self._condition.wait()
+            self.in_flight += 1
+            delay = self._delay()
+            if delay > 0:
+                self.delay_count += 1
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, response=None):
+        with self._condition:
+            self.in_flight -= 1
+            if response is not None:
+                self._update(response)
+            self._condition.notify_all()
+
+    def _delay(self):
+        if self.remaining is None or self.remaining >= self.threshold:
+            return 0
+        return self.max_delay * (1 - max(self.remaining, 0) / self.threshold)
+
+    def _update(self, response):
+        if self.is_throttled(response):
+            self.throttled_count += 1
+            self.remaining = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            return
+
+        try:
+            remaining = float(response.getheader("X-Rate-Limit-Remaining"))
+        except (TypeError, ValueError):
+            return
+
+        try:
+            self.request_cost = float(response.getheader("X-Request-Cost"))
+        except (TypeError, ValueError):
+            pass
+
+        self.remaining = remaining
+        if remaining < self.threshold:
+            self.concurrency = max(1, self.concurrency // 2)
+        elif self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+
+    @staticmethod
+    def is_throttled(response):
+        if response.status != 403:
+            return False
+        data = response.data
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        return "Rate Limit Exceeded" in (data or "")
+
 
 class Canvas_DAO(DAO):
+    throttles = {}
+    _throttles_lock = Lock()
+
     def __init__(self, *args, **kwargs):
         self.canvas_api_host = kwargs.get("canvas_api_host")
         super().__init__()
 
+    def get_throttle(self):
+        """
+        Return the rate limit throttle shared by all Canvas_DAO instances
+        for the configured host.
+        """
+        host = self.get_service_setting("HOST")
+        with Canvas_DAO._throttles_lock:
+            if host not in Canvas_DAO.throttles:
+                Canvas_DAO.throttles[host] = CanvasThrottle(
+                    max_concurrency=int(self.get_service_setting(
+                        "THROTTLE_CONCURRENCY", self.get_service_setting(
+                            "POOL_SIZE", self.get_setting(
+                                "DEFAULT_POOL_SIZE", 10)))),
+                    threshold=float(self.get_service_setting(
+                        "THROTTLE_THRESHOLD", 300)),
+                    max_delay=float(self.get_service_setting(
+                        "THROTTLE_MAX_DELAY", 1.0)))
+            return Canvas_DAO.throttles[host]
+
+    def putURL(self, url, headers, body=None, retry=False):
+        """
+        Request a URL using the HTTP method PUT, retrying transient
+        failures if the request is marked safe to retry.
+        """
+        return self._load_resource("PUT", url, headers, body, retry=retry)
+
+    def _load_resource(self, method, url, headers, body, retry=None):
+        """
+        Load the resource, retrying GET requests (or others if retry is
+        True) that were throttled or failed with a transient error.
+        """
+        if retry is None:
+            retry = (method == "GET")
+        max_retries = int(self.get_service_setting("RETRY_MAX", 3)) if (
+            retry) else 0
+
+        attempt = 0
+        while True:
+            try:
+                response = self._load_throttled_resource(
+                    method, url, headers, body)
+            except DataFailureException as ex:
+                if ex.status != 0 or attempt >= max_retries:
+                    raise
+                response = None
+            else:
+                if attempt >= max_retries or not self._is_retryable(response):
+                    return response
+
+            delay = self._retry_delay(response, attempt)
+            attempt += 1
+            prometheus_retry.labels(
+                self.service_name(),
+                response.status if response is not None else 0).inc()
+            time.sleep(delay)
+
+    def _load_throttled_resource(self, method, url, headers, body):
+        throttle = self.get_throttle()
+        throttle.acquire()
+        response = None
+        try:
+            response = super()._load_resource(method, url, headers, body)
+            return response
+        finally:
+            throttle.release(response)
+
+    def _is_retryable(self, response):
+        return (response.status in RETRY_STATUS_CODES or
+                CanvasThrottle.is_throttled(response))
+
+    def _retry_delay(self, response, attempt):
+        """
+        Return the seconds to wait before the next attempt: the response
+        Retry-After value if present, otherwise exponential backoff with
+        full jitter, at most RETRY_MAX_BACKOFF.
+        """
+        max_backoff = float(self.get_service_setting("RETRY_MAX_BACKOFF", 30))
+        if response is not None:
+            try:
+                return min(max(float(response.getheader("Retry-After")), 0),
+                           max_backoff)
+            except (TypeError, ValueError):
+                pass
+
+        backoff = float(self.get_service_setting("RETRY_BACKOFF", 0.5))
+        return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
     def service_name(self):
         return "canvas"
 
@@ -80,8 +260,26 @@ class CanvasFileDownload_DAO(DAO):
     def _get_live_implementation(self):
         return CanvasFileDownloadLiveDAO(self.service_name(), self)
 
+    def streamURL(self, url, headers={}):
+        """
+        Request a URL using the HTTP method GET, without reading the
+        response body, which live responses return in chunks from
+        response.stream().
+        """
+        headers = dict(headers)
+        headers.update(self._custom_headers("GET", url, headers, None))
+
+        backend = self.get_implementation()
+        if backend.is_live():
+            return backend.load("GET", url, headers, None,
+                                preload_content=False)
+        return backend.load("GET", url, headers, None)
+
 
 class CanvasFileDownloadLiveDAO(LiveDAO):
+    pools = {}
+    _pools_lock = Lock()
+
     def _fix_url_host(self, url):
         # Ensure file url matches the hostname in settings,
         # to avoid mixing Canvas prod/test/beta hosts
@@ -97,17 +295,38 @@ class CanvasFileDownloadLiveDAO(LiveDAO):
             redirect=int(self.dao.get_service_setting("FILE_REDIRECT", 1))
         )
 
-    def load(self, method, url, headers, body):
+    def _get_max_pool_size(self):
+        return int(self.dao.get_service_setting(
+            "FILE_POOL_SIZE", super()._get_max_pool_size()))
+
+    def _get_num_pools(self):
+        return int(self.dao.get_service_setting("FILE_NUM_POOLS", 10))
+
+    def _get_keep_alive(self):
+        return str(self.dao.get_service_setting(
+            "FILE_KEEP_ALIVE", True)).lower() not in ("false", "0")
+
+    def load(self, method, url, headers, body, preload_content=True):
         url = self._fix_url_host(url)
+        headers = dict(headers or {})
+        headers.setdefault(
+            "Connection", "keep-alive" if self._get_keep_alive() else "close")
         pool = self.get_pool()
-        return pool.urlopen(method, url, headers=headers)
+        return pool.urlopen(method, url, headers=headers,
+                            preload_content=preload_content)
 
     def get_pool(self):
-        return self.create_pool()
+        host = self.dao.get_service_setting("HOST")
+        with CanvasFileDownloadLiveDAO._pools_lock:
+            if host not in CanvasFileDownloadLiveDAO.pools:
+                CanvasFileDownloadLiveDAO.pools[host] = self.create_pool()
+            return CanvasFileDownloadLiveDAO.pools[host]
 
     def create_pool(self):
-        # Use a PoolManager to allow redirects to other hosts
+        # Use a PoolManager to allow redirects to other hosts, keeping a
+        # connection pool for each of up to num_pools hosts
         return PoolManager(
+            num_pools=self._get_num_pools(),
             cert_reqs="CERT_REQUIRED",
             ca_certs=self.dao.get_setting("CA_BUNDLE",
                                           "/etc/ssl/certs/ca-bundle.crt"),
@@ -116,3 +335,21 @@ class CanvasFileDownloadLiveDAO(LiveDAO):
             block=True,
             retries=self._get_retry()
         )
+
+    @classmethod
+    def get_pool_stats(cls):
+        """
+        Return the connection and request counts of the pool for each
+        host connected to, by Canvas host.
+        """
+        stats = {}
+        with cls._pools_lock:
+            for canvas_host, manager in cls.pools.items():
+                stats[canvas_host] = {}
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is not None:
+                        stats[canvas_host][key.key_host] = {
+                            "connections": pool.num_connections,
+                            "requests": pool.num_requests}
+        return stats
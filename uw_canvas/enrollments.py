@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas
+from uw_canvas import Canvas, AsyncCanvas, async_method
 from uw_canvas.courses import Courses, COURSES_API
 from uw_canvas.sections import SECTIONS_API
 from uw_canvas.users import USERS_API
@@ -32,6 +32,26 @@ class Enrollments(Canvas):
         return self.get_enrollments_for_course(
             self._sis_id(sis_course_id, sis_field="course"), params)
 
+    def iter_enrollments_for_course(self, course_id, params={}):
+        """
+        Return an iterator over all enrollments for the passed course_id,
+        fetching pages as they are consumed.
+
+        https://canvas.instructure.com/doc/api/enrollments.html#method.enrollments_api.index
+        """
+        url = COURSES_API.format(course_id) + "/enrollments"
+
+        for datum in self._iter_paged_resource(url, params=params):
+            yield CanvasEnrollment(data=datum)
+
+    def iter_enrollments_for_course_by_sis_id(self, sis_course_id,
+                                              params={}):
+        """
+        Return an iterator over all enrollments for the passed course sis id.
+        """
+        return self.iter_enrollments_for_course(
+            self._sis_id(sis_course_id, sis_field="course"), params)
+
     def get_enrollments_for_section(self, section_id, params={}):
         """
         Return a list of all enrollments for the passed section_id.
@@ -53,6 +73,26 @@ class Enrollments(Canvas):
         return self.get_enrollments_for_section(
             self._sis_id(sis_section_id, sis_field="section"), params)
 
+    def iter_enrollments_for_section(self, section_id, params={}):
+        """
+        Return an iterator over all enrollments for the passed section_id,
+        fetching pages as they are consumed.
+
+        https://canvas.instructure.com/doc/api/enrollments.html#method.enrollments_api.index
+        """
+        url = SECTIONS_API.format(section_id) + "/enrollments"
+
+        for datum in self._iter_paged_resource(url, params=params):
+            yield CanvasEnrollment(data=datum)
+
+    def iter_enrollments_for_section_by_sis_id(self, sis_section_id,
+                                               params={}):
+        """
+        Return an iterator over all enrollments for the passed section sis id.
+        """
+        return self.iter_enrollments_for_section(
+            self._sis_id(sis_section_id, sis_field="section"), params)
+
     def get_enrollments_for_regid(self, regid, params={},
                                   include_courses=False):
         """
@@ -113,3 +153,22 @@ class Enrollments(Canvas):
             params['role_id'] = role_id
 
         return self.enroll_user(course_id, user_id, enrollment_type, params)
+
+
+class AsyncEnrollments(AsyncCanvas):
+    """
+    Coroutine versions of the Enrollments methods.
+    """
+    _sync_class = Enrollments
+
+    get_enrollments_for_course = async_method(
+        Enrollments.get_enrollments_for_course)
+    get_enrollments_for_course_by_sis_id = async_method(
+        Enrollments.get_enrollments_for_course_by_sis_id)
+    get_enrollments_for_section = async_method(
+        Enrollments.get_enrollments_for_section)
+    get_enrollments_for_section_by_sis_id = async_method(
+        Enrollments.get_enrollments_for_section_by_sis_id)
+    get_enrollments_for_regid = async_method(
+        Enrollments.get_enrollments_for_regid)
+    enroll_user = async_method(Enrollments.enroll_user)
@@ -456,6 +456,8 @@ class Report(models.Model):
     url = models.CharField(max_length=500)
     status = models.CharField(max_length=50)
     progress = models.SmallIntegerField(max_length=3, default=0)
+    created_at = models.DateTimeField(null=True)
+    ended_at = models.DateTimeField(null=True)
     attachment = models.ForeignKey(Attachment, null=True)
 
     def __init__(self, *args, **kwargs):
@@ -470,6 +472,12 @@ class Report(models.Model):
         self.status = data['status']
         self.progress = data['progress']
         self.parameters = data['parameters']
+        self.created_at = None
+        self.ended_at = None
+        if 'created_at' in data and data['created_at']:
+            self.created_at = dateutil.parser.parse(data['created_at'])
+        if 'ended_at' in data and data['ended_at']:
+            self.ended_at = dateutil.parser.parse(data['ended_at'])
 
         if 'attachment' in data:
             self.attachment = Attachment(data=data['attachment'])
@@ -513,6 +521,12 @@ class SISImport(models.Model):
     progress = models.CharField(max_length=3)
     override_sis_stickiness = models.BooleanField()
     clear_sis_stickiness = models.BooleanField()
+    batch_mode = models.BooleanField()
+    batch_mode_term_id = models.CharField(max_length=100, null=True)
+    diffing_data_set_identifier = models.CharField(max_length=100, null=True)
+    diffed_against_import_id = models.IntegerField(null=True)
+    diffing_drop_status = models.CharField(max_length=20, null=True)
+    change_threshold = models.IntegerField(null=True)
     post_url = models.CharField(max_length=100)
     post_headers = models.CharField(max_length=500)
 
@@ -528,9 +542,34 @@ class SISImport(models.Model):
         self.clear_sis_stickiness = data['clear_sis_stickiness']
         self.processing_warnings = data.get('processing_warnings', [])
         self.processing_errors = data.get('processing_errors', [])
+        self.batch_mode = data.get('batch_mode', False)
+        self.batch_mode_term_id = data.get('batch_mode_term_id')
+        self.diffing_data_set_identifier = data.get(
+            'diffing_data_set_identifier')
+        self.diffed_against_import_id = data.get('diffed_against_import_id')
+        self.diffing_drop_status = data.get('diffing_drop_status')
+        self.change_threshold = data.get('change_threshold')
+        self.counts = (data.get('data') or {}).get('counts', {})
+        self.statistics = data.get('statistics') or {}
+        self.errors = []
         self.post_url = data.get('post_url')
         self.post_headers = data.get('post_headers', {})
 
+    def is_diffed(self):
+        return self.diffed_against_import_id is not None
+
+    def diff_stats(self):
+        """
+        Returns the diffing data set, the import diffed against, and the
+        counts of imported rows and of object changes, by type.
+        """
+        return {
+            'diffing_data_set_identifier': self.diffing_data_set_identifier,
+            'diffed_against_import_id': self.diffed_against_import_id,
+            'counts': self.counts,
+            'statistics': self.statistics,
+        }
+
 
 class SISImportError(models.Model):
     CSV_IMPORT_TYPE = 'instructure_csv'
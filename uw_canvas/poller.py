@@ -0,0 +1,121 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Contains the status poll scheduling shared by long-running Canvas jobs,
+such as account reports and SIS imports.
+"""
+from commonconf import settings
+import time
+
+
+class StatusPoller(object):
+    """
+    Schedules status polls for a set of long-running jobs.  Each job is
+    next polled when its progress rate suggests it will be finished, or
+    after an exponentially increasing interval while it makes no
+    progress, bounded by the <settings_prefix>_INTERVAL and
+    <settings_prefix>_MAX_INTERVAL settings.  Subclasses define when a
+    job is finished and the exception raised at the deadline.
+    """
+    settings_prefix = None
+
+    def __init__(self, jobs, timeout=None):
+        self.min_interval = float(getattr(
+            settings, self.settings_prefix + '_INTERVAL', 5))
+        self.max_interval = float(getattr(
+            settings, self.settings_prefix + '_MAX_INTERVAL', 60))
+        self.backoff = float(getattr(
+            settings, self.settings_prefix + '_BACKOFF', 2))
+
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.jobs = []
+        self._polls = {}
+        for job in jobs:
+            self.add(job)
+
+    def add(self, job):
+        """
+        Adds a job to poll, returning its index.
+        """
+        self.jobs.append(job)
+        i = len(self.jobs) - 1
+        if not self._is_finished(job):
+            self._polls[i] = (time.time(), _progress(job), self.min_interval)
+        return i
+
+    def is_done(self):
+        return not self._polls
+
+    def remove(self, i):
+        """
+        Stops polling the job at index i.
+        """
+        self._polls.pop(i, None)
+
+    def running(self):
+        """
+        Returns the jobs that are not yet finished.
+        """
+        return [self.jobs[i] for i in self._polls]
+
+    def next_delay(self):
+        """
+        Returns the seconds until the next job is due to be polled,
+        raising the timeout exception if the deadline has passed.
+        """
+        now = time.time()
+        if self.deadline is not None and now >= self.deadline:
+            raise self._timeout_exception()
+
+        delay = max(0, min(polled + interval for (
+            polled, progress, interval) in self._polls.values()) - now)
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - now)
+        return delay
+
+    def due(self):
+        """
+        Returns the indexes of the jobs due to be polled.
+        """
+        now = time.time()
+        return [i for i, (polled, progress, interval) in self._polls.items()
+                if polled + interval <= now]
+
+    def update(self, i, job):
+        """
+        Records the polled status of the job at index i, returning True
+        if it has finished.
+        """
+        self.jobs[i] = job
+        if self._is_finished(job):
+            self._polls.pop(i, None)
+            return True
+
+        now = time.time()
+        polled, last_progress, interval = self._polls[i]
+        progress = _progress(job)
+        if (progress is not None and last_progress is not None and
+                progress > last_progress and now > polled):
+            rate = (progress - last_progress) / (now - polled)
+            interval = (100 - progress) / rate
+        else:
+            interval = interval * self.backoff
+
+        self._polls[i] = (now, progress, min(
+            max(interval, self.min_interval), self.max_interval))
+        return False
+
+    def _is_finished(self, job):
+        raise NotImplementedError()
+
+    def _timeout_exception(self):
+        raise NotImplementedError()
+
+
+def _progress(job):
+    try:
+        return float(job.progress)
+    except (TypeError, ValueError):
+        return None
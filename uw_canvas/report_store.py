@@ -0,0 +1,134 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Contains a memory-mapped csv report file indexed by key columns.
+"""
+import mmap
+import csv
+import io
+import os
+
+DEFAULT_REPORT_KEYS = ("canvas_course_id", "course_id", "canvas_section_id",
+                       "section_id", "canvas_user_id", "user_id")
+
+
+class ReportStore(object):
+    """
+    A csv report file, memory-mapped, with an index of the byte offsets of
+    rows by the values of key columns.  Looking up a row decodes only
+    that row.
+    """
+    def __init__(self, path, keys=DEFAULT_REPORT_KEYS, remove=False):
+        self.path = path
+        self._remove = remove
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = None
+
+        self.columns = []
+        self._indexes = {}
+        self._build_index(keys)
+
+    def _build_index(self, keys):
+        if self._mmap is None:
+            return
+
+        offsets = [0]
+
+        def lines():
+            for line in iter(self._mmap.readline, b""):
+                offsets[0] += len(line)
+                yield line.decode("utf-8-sig")
+
+        reader = csv.reader(lines())
+        self.columns = next(reader, [])
+        positions = [(self.columns.index(key), self._indexes.setdefault(
+            key, {})) for key in keys if key in self.columns]
+
+        while True:
+            offset = offsets[0]
+            row = next(reader, None)
+            if row is None:
+                break
+            for i, index in positions:
+                if i < len(row) and row[i]:
+                    existing = index.get(row[i])
+                    if existing is None:
+                        index[row[i]] = offset
+                    elif isinstance(existing, list):
+                        existing.append(offset)
+                    else:
+                        index[row[i]] = [existing, offset]
+
+    def keys(self):
+        """
+        Returns the indexed column names.
+        """
+        return list(self._indexes.keys())
+
+    def get(self, column, value):
+        """
+        Returns the first row, as a dict, with the passed value in the
+        indexed column, or None.
+        """
+        offsets = self._offsets(column, value)
+        return self._read_row(offsets[0]) if offsets else None
+
+    def get_all(self, column, value):
+        """
+        Returns the rows, as dicts, with the passed value in the indexed
+        column.
+        """
+        return [self._read_row(offset) for offset in self._offsets(
+            column, value)]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+        if self._remove:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _offsets(self, column, value):
+        offsets = self._indexes[column].get(str(value))
+        if offsets is None:
+            return []
+        return offsets if isinstance(offsets, list) else [offsets]
+
+    def _read_row(self, offset):
+        text = self._mmap[offset:self._record_end(offset)].decode("utf-8")
+        row = next(csv.reader(io.StringIO(text, newline="")), [])
+        return dict(zip(self.columns, row))
+
+    def _record_end(self, offset):
+        """
+        Returns the offset after the newline ending the record at offset,
+        skipping newlines within quoted fields.
+        """
+        quoted = False
+        i = offset
+        while True:
+            if quoted:
+                quote = self._mmap.find(b'"', i)
+                if quote < 0:
+                    return len(self._mmap)
+                quoted = False
+            else:
+                newline = self._mmap.find(b"\n", i)
+                end = len(self._mmap) if newline < 0 else newline + 1
+                quote = self._mmap.find(b'"', i, end)
+                if quote < 0:
+                    return end
+                quoted = True
+            i = quote + 1
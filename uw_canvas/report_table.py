@@ -0,0 +1,454 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Contains a column-oriented table for provisioning and SIS export report
+data.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import dateutil.parser
+import math
+import csv
+import io
+import os
+import sys
+
+INTEGER = "integer"
+CATEGORY = "category"
+TIMESTAMP = "timestamp"
+STRING = "string"
+
+# Types of the known provisioning and SIS export report columns, others
+# are read as strings
+REPORT_COLUMN_TYPES = {
+    "canvas_account_id": INTEGER,
+    "canvas_parent_id": INTEGER,
+    "canvas_course_id": INTEGER,
+    "canvas_section_id": INTEGER,
+    "canvas_nonxlist_course_id": INTEGER,
+    "canvas_term_id": INTEGER,
+    "canvas_user_id": INTEGER,
+    "canvas_associated_user_id": INTEGER,
+    "canvas_group_id": INTEGER,
+    "canvas_group_category_id": INTEGER,
+    "role_id": INTEGER,
+    "account_id": CATEGORY,
+    "parent_account_id": CATEGORY,
+    "term_id": CATEGORY,
+    "status": CATEGORY,
+    "role": CATEGORY,
+    "base_role_type": CATEGORY,
+    "course_format": CATEGORY,
+    "blueprint_course_id": CATEGORY,
+    "authentication_provider_id": CATEGORY,
+    "declared_user_type": CATEGORY,
+    "created_by_sis": CATEGORY,
+    "limit_section_privileges": CATEGORY,
+    "start_date": TIMESTAMP,
+    "end_date": TIMESTAMP,
+    "created_at": TIMESTAMP,
+    "updated_at": TIMESTAMP,
+    "last_activity_at": TIMESTAMP,
+}
+
+MISSING_INTEGER = -1
+MISSING_TIMESTAMP = -math.inf
+READ_BLOCK_SIZE = 1048576
+# Maximum bytes of a report file parsed as one range by a worker process
+RANGE_SIZE = 33554432
+
+
+class IntegerColumn(object):
+    """
+    Integer values in an array, with missing values stored as -1.
+    """
+    def __init__(self, values=None):
+        self.values = array("q") if values is None else values
+
+    def append(self, value):
+        self.values.append(int(value) if value else MISSING_INTEGER)
+
+    def encode(self, value):
+        return MISSING_INTEGER if value is None else int(value)
+
+    def decode(self, value):
+        return None if value == MISSING_INTEGER else value
+
+    def take(self, indexes):
+        return IntegerColumn(array("q", [self.values[i] for i in indexes]))
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+
+class TimestampColumn(object):
+    """
+    Timestamps as POSIX times in an array, with missing values stored as
+    -inf.
+    """
+    def __init__(self, values=None):
+        self.values = array("d") if values is None else values
+
+    def append(self, value):
+        self.values.append(
+            dateutil.parser.isoparse(value).timestamp() if value else
+            MISSING_TIMESTAMP)
+
+    def encode(self, value):
+        return MISSING_TIMESTAMP if value is None else value.timestamp()
+
+    def decode(self, value):
+        if value == MISSING_TIMESTAMP:
+            return None
+        return datetime.fromtimestamp(value, timezone.utc)
+
+    def take(self, indexes):
+        return TimestampColumn(array("d", [self.values[i] for i in indexes]))
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+
+class CategoryColumn(object):
+    """
+    Repeated strings, stored as an array of codes into a list of the
+    distinct values.
+    """
+    def __init__(self, values=None, categories=None):
+        self.values = array("l") if values is None else values
+        self.categories = [] if categories is None else categories
+        self._codes = {value: code for code, value in enumerate(
+            self.categories)}
+
+    def append(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.categories)
+            self.categories.append(sys.intern(value))
+        self.values.append(code)
+
+    def encode(self, value):
+        return self._codes.get(value, -1)
+
+    def decode(self, value):
+        return self.categories[value]
+
+    def take(self, indexes):
+        return CategoryColumn(array("l", [self.values[i] for i in indexes]),
+                              list(self.categories))
+
+    def extend(self, other):
+        codes = []
+        for value in other.categories:
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.categories)
+                self.categories.append(sys.intern(value))
+            codes.append(code)
+        self.values.extend(codes[code] for code in other.values)
+
+
+class StringColumn(object):
+    """
+    Strings in a list.
+    """
+    def __init__(self, values=None):
+        self.values = [] if values is None else values
+
+    def append(self, value):
+        self.values.append(value)
+
+    def encode(self, value):
+        return value
+
+    def decode(self, value):
+        return value
+
+    def take(self, indexes):
+        return StringColumn([self.values[i] for i in indexes])
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+
+COLUMN_CLASSES = {
+    INTEGER: IntegerColumn,
+    CATEGORY: CategoryColumn,
+    TIMESTAMP: TimestampColumn,
+    STRING: StringColumn,
+}
+
+
+class ReportTable(object):
+    """
+    Report rows stored by column, with integer IDs and timestamps in
+    arrays and repeated values such as role, status and term stored once.
+    """
+    def __init__(self, columns, data):
+        self.columns = list(columns)
+        self._data = dict(zip(self.columns, data))
+
+    @classmethod
+    def from_rows(cls, rows, column_types=REPORT_COLUMN_TYPES):
+        """
+        Returns a ReportTable for csv rows, the first of which is the
+        header row.
+        """
+        rows = iter(rows)
+        columns = next(rows, [])
+        data = [COLUMN_CLASSES[column_types.get(name, STRING)]()
+                for name in columns]
+        appends = [column.append for column in data]
+        for row in rows:
+            if not row:
+                continue
+            if len(row) < len(appends):
+                row = row + [""] * (len(appends) - len(row))
+            for append, value in zip(appends, row):
+                append(value)
+        return cls(columns, data)
+
+    @classmethod
+    def from_file(cls, path, processes=None, column_types=REPORT_COLUMN_TYPES,
+                  **criteria):
+        """
+        Returns a ReportTable for the rows of the csv file at path that
+        match the filter criteria, parsing ranges of the file across a
+        pool of processes.  Criteria functions must be picklable.
+        """
+        tables = _map_report_file(path, processes, column_types, criteria)
+        table = next(tables)
+        for other in tables:
+            table.extend(other)
+        return table
+
+    def extend(self, other):
+        """
+        Appends the rows of another ReportTable with the same columns.
+        """
+        for name in self.columns:
+            self._data[name].extend(other._data[name])
+
+    def __len__(self):
+        return len(self._data[self.columns[0]].values) if (
+            self.columns) else 0
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def row(self, i):
+        """
+        Returns row i as a dict.
+        """
+        return {name: column.decode(column.values[i])
+                for name, column in self._data.items()}
+
+    def column(self, name):
+        """
+        Returns the values of the named column as a list.
+        """
+        column = self._data[name]
+        return [column.decode(value) for value in column.values]
+
+    def take(self, indexes):
+        """
+        Returns a ReportTable of the rows at the passed indexes.
+        """
+        return ReportTable(self.columns, [
+            self._data[name].take(indexes) for name in self.columns])
+
+    def filter(self, **criteria):
+        """
+        Returns a ReportTable of the rows matching all of the criteria,
+        given as column=value or column=function of the value.
+        """
+        indexes = range(len(self))
+        for name, criterion in criteria.items():
+            column = self._data[name]
+            values = column.values
+            if callable(criterion):
+                decode = column.decode
+                indexes = [i for i in indexes if criterion(decode(values[i]))]
+            else:
+                encoded = column.encode(criterion)
+                indexes = [i for i in indexes if values[i] == encoded]
+        return self.take(indexes)
+
+    def group_by(self, name):
+        """
+        Returns a dict of ReportTables, by each value of the named column.
+        """
+        column = self._data[name]
+        groups = {}
+        for i, value in enumerate(column.values):
+            groups.setdefault(value, []).append(i)
+        return {column.decode(value): self.take(indexes)
+                for value, indexes in groups.items()}
+
+    def counts(self, name):
+        """
+        Returns a dict of row counts, by each value of the named column.
+        """
+        column = self._data[name]
+        counts = {}
+        for value in column.values:
+            counts[value] = counts.get(value, 0) + 1
+        return {column.decode(value): count
+                for value, count in counts.items()}
+
+
+def count_report_file(path, name, processes=None,
+                      column_types=REPORT_COLUMN_TYPES, **criteria):
+    """
+    Returns a dict of counts, by each value of the named column, of the
+    rows of the csv file at path that match the filter criteria, counting
+    ranges of the file across a pool of processes.
+    """
+    counts = {}
+    for range_counts in _map_report_file(
+            path, processes, column_types, criteria, count_column=name):
+        for value, count in range_counts.items():
+            counts[value] = counts.get(value, 0) + count
+    return counts
+
+
+def split_report_file(path, chunks):
+    """
+    Returns the header row of the csv file at path, and up to chunks
+    (start, end) byte ranges of the rest of the file, of about equal size
+    and aligned on record boundaries.  Newlines within quoted fields are
+    not record boundaries.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_end = _record_end(f, 0, False)
+        boundaries = [header_end]
+        pos = header_end
+        for n in range(1, chunks):
+            target = header_end + (size - header_end) * n // chunks
+            if target <= pos:
+                continue
+            quoted = _count_quotes(f, pos, target) % 2 == 1
+            pos = _record_end(f, target, quoted)
+            boundaries.append(pos)
+        boundaries.append(size)
+
+        f.seek(0)
+        header_text = f.read(header_end).decode("utf-8-sig")
+
+    header = next(csv.reader(io.StringIO(header_text, newline="")), [])
+    ranges = [(start, end) for start, end in zip(
+        boundaries, boundaries[1:]) if start < end]
+    return header, ranges
+
+
+def _count_quotes(f, start, end):
+    f.seek(start)
+    count = 0
+    while start < end:
+        block = f.read(min(READ_BLOCK_SIZE, end - start))
+        if not block:
+            break
+        count += block.count(b'"')
+        start += len(block)
+    return count
+
+
+def _record_end(f, offset, quoted):
+    """
+    Returns the offset after the first newline at or after offset that
+    is outside a quoted field, or the end of the file.
+    """
+    f.seek(offset)
+    while True:
+        block = f.read(READ_BLOCK_SIZE)
+        if not block:
+            return offset
+
+        i = 0
+        while True:
+            if quoted:
+                quote = block.find(b'"', i)
+                if quote < 0:
+                    break
+                quoted = False
+                i = quote + 1
+            else:
+                quote = block.find(b'"', i)
+                newline = block.find(b'\n', i)
+                if newline >= 0 and (quote < 0 or newline < quote):
+                    return offset + newline + 1
+                if quote < 0:
+                    break
+                quoted = True
+                i = quote + 1
+        offset += len(block)
+
+
+def _map_report_file(path, processes, column_types, criteria,
+                     count_column=None):
+    """
+    Generates the result of parsing each range of the file at path, in
+    order.  The file is split into at least one range per process, and
+    into ranges of about RANGE_SIZE bytes for larger files.
+    """
+    processes = processes or os.cpu_count() or 1
+    chunks = max(processes, math.ceil(os.path.getsize(path) / RANGE_SIZE))
+    header, ranges = split_report_file(path, chunks)
+    if not ranges:
+        ranges = [(0, 0)]
+
+    args = [(path, header, start, end, column_types, criteria, count_column)
+            for start, end in ranges]
+    if processes == 1 or len(ranges) == 1:
+        for arg in args:
+            yield _parse_report_range(*arg)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        yield from pool.map(_parse_report_range, *zip(*args))
+
+
+def _parse_report_range(path, header, start, end, column_types, criteria,
+                        count_column):
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = io.TextIOWrapper(
+            io.BufferedReader(_RangeReader(f, end - start), READ_BLOCK_SIZE),
+            encoding="utf-8", newline="")
+        table = ReportTable.from_rows(_with_header(header, csv.reader(text)),
+                                      column_types=column_types)
+    if criteria:
+        table = table.filter(**criteria)
+    if count_column is not None:
+        return table.counts(count_column)
+    return table
+
+
+class _RangeReader(io.RawIOBase):
+    """
+    Reads at most size bytes from the current position of file f.
+    """
+    def __init__(self, f, size):
+        self._f = f
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._remaining <= 0:
+            return 0
+        data = self._f.read(min(len(b), self._remaining))
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
@@ -2,15 +2,27 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas
+from uw_canvas import Canvas, AsyncCanvas, async_method
 from uw_canvas.dao import CanvasFileDownload_DAO
 from uw_canvas.accounts import ACCOUNTS_API
 from uw_canvas.models import Report, ReportType, Attachment
+from uw_canvas.report_table import ReportTable, REPORT_COLUMN_TYPES
+from uw_canvas.report_store import ReportStore, DEFAULT_REPORT_KEYS
+from uw_canvas.poller import StatusPoller
 from restclients_core.exceptions import DataFailureException
 from commonconf import settings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from time import sleep
+import asyncio
+import codecs
+import tempfile
+import csv
+import os
 import re
 
+REPORT_CHUNK_SIZE = 65536
+
 
 class ReportFailureException(Exception):
     """
@@ -23,6 +35,63 @@ class ReportFailureException(Exception):
         return ("Error fetching report {}".format(self.report.report_id))
 
 
+class ReportTimeoutException(ReportFailureException):
+    """
+    This exception means a report did not complete before the deadline.
+    """
+    def __str__(self):
+        return ("Timed out waiting for report {}".format(
+            self.report.report_id))
+
+
+class ReportPoller(StatusPoller):
+    """
+    Schedules status polls for a set of running reports, bounded by the
+    CANVAS_REPORT_POLLING_INTERVAL and CANVAS_REPORT_POLLING_MAX_INTERVAL
+    settings.  A report that fails raises ReportFailureException.
+    """
+    settings_prefix = "CANVAS_REPORT_POLLING"
+
+    def __init__(self, reports, timeout=None, callback=None):
+        self.callback = callback
+        super(ReportPoller, self).__init__(reports, timeout=timeout)
+
+    @property
+    def reports(self):
+        return self.jobs
+
+    def add(self, report):
+        """
+        Adds a report to poll, returning its index.
+        """
+        if report.report_id is None or report.status is None:
+            raise ReportFailureException(report)
+        if report.status == "error":
+            raise ReportFailureException(report)
+        return super(ReportPoller, self).add(report)
+
+    def update(self, i, report):
+        """
+        Records the polled status of the report at index i, returning True
+        if it is complete.
+        """
+        if self.callback is not None:
+            self.callback(report)
+
+        if report.status == "error":
+            self.reports[i] = report
+            self.remove(i)
+            raise ReportFailureException(report)
+
+        return super(ReportPoller, self).update(i, report)
+
+    def _is_finished(self, report):
+        return report.status == "complete"
+
+    def _timeout_exception(self):
+        return ReportTimeoutException(self.reports[min(self._polls)])
+
+
 class Reports(Canvas):
     def get_available_reports(self, account_id):
         """
@@ -54,12 +123,63 @@ class Reports(Canvas):
 
         return reports
 
-    def create_report(self, report_type, account_id, term_id=None, params={}):
+    def iter_reports_by_type(self, account_id, report_type):
+        """
+        Return an iterator over the reports of the passed report_type that
+        have been run for the canvas account id, newest first, fetching
+        pages as they are consumed.
+
+        https://canvas.instructure.com/doc/api/account_reports.html#method.account_reports.index
+        """
+        url = ACCOUNTS_API.format(account_id) + "/reports/{}".format(
+            report_type)
+
+        for datum in self._iter_paged_resource(url):
+            datum["account_id"] = account_id
+            yield Report(data=datum)
+
+    def get_recent_report(self, report_type, account_id, term_id=None,
+                          params={}, max_age=3600):
+        """
+        Returns the most recent completed report of report_type for the
+        canvas account id that was run with the same parameters within
+        max_age seconds, or None.  Only reports created within max_age
+        seconds are fetched.
         """
-        Generates a report instance for the canvas account id.
+        params = dict(params)
+        if term_id is not None:
+            params["enrollment_term_id"] = str(term_id)
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age)
+        recent = None
+        for report in self.iter_reports_by_type(account_id, report_type):
+            if report.created_at is not None and report.created_at < cutoff:
+                break
+            if (report.status == "complete" and
+                    report.attachment is not None and
+                    report.ended_at is not None and
+                    report.ended_at >= cutoff and
+                    _report_parameters(report.parameters) ==
+                    _report_parameters(params) and
+                    (recent is None or report.ended_at > recent.ended_at)):
+                recent = report
+        return recent
+
+    def create_report(self, report_type, account_id, term_id=None, params={},
+                      max_age=None):
+        """
+        Generates a report instance for the canvas account id.  If
+        max_age is passed, returns a completed report with the same
+        parameters run within max_age seconds instead, if there is one.
 
         https://canvas.instructure.com/doc/api/account_reports.html#method.account_reports.create
         """
+        if max_age is not None:
+            report = self.get_recent_report(
+                report_type, account_id, term_id, params, max_age=max_age)
+            if report is not None:
+                return report
+
         if term_id is not None:
             params["enrollment_term_id"] = str(term_id)
 
@@ -72,54 +192,54 @@ class Reports(Canvas):
         return Report(data=data)
 
     def create_course_provisioning_report(self, account_id, term_id=None,
-                                          params={}):
+                                          params={}, max_age=None):
         """
         Convenience method for create_report, for creating a course
         provisioning report.
         """
         params["courses"] = True
         return self.create_report(ReportType.PROVISIONING, account_id, term_id,
-                                  params)
+                                  params, max_age=max_age)
 
     def create_enrollments_provisioning_report(self, account_id, term_id=None,
-                                               params={}):
+                                               params={}, max_age=None):
         """
         Convenience method for create_report, for creating an enrollment
         provisioning report.
         """
         params["enrollments"] = True
         return self.create_report(ReportType.PROVISIONING, account_id, term_id,
-                                  params)
+                                  params, max_age=max_age)
 
     def create_user_provisioning_report(self, account_id, term_id=None,
-                                        params={}):
+                                        params={}, max_age=None):
         """
         Convenience method for create_report, for creating a user
         provisioning report.
         """
         params["users"] = True
         return self.create_report(ReportType.PROVISIONING, account_id, term_id,
-                                  params)
+                                  params, max_age=max_age)
 
     def create_xlist_provisioning_report(self, account_id, term_id=None,
-                                         params={}):
+                                         params={}, max_age=None):
         """
         Convenience method for create_report, for creating a crosslist
         provisioning report.
         """
         params["xlist"] = True
         return self.create_report(ReportType.PROVISIONING, account_id, term_id,
-                                  params)
+                                  params, max_age=max_age)
 
     def create_course_sis_export_report(self, account_id, term_id=None,
-                                        params={}):
+                                        params={}, max_age=None):
         """
         Convenience method for create_report, for creating a course sis export
         report.
         """
         params["courses"] = True
         return self.create_report(ReportType.SIS_EXPORT, account_id, term_id,
-                                  params)
+                                  params, max_age=max_age)
 
     def create_unused_courses_report(self, account_id, term_id=None):
         """
@@ -133,23 +253,241 @@ class Reports(Canvas):
         """
         Returns a completed report as a list of csv strings.
         """
-        if report.report_id is None or report.status is None:
-            raise ReportFailureException(report)
-
-        interval = getattr(settings, 'CANVAS_REPORT_POLLING_INTERVAL', 5)
-        while report.status != "complete":
-            if report.status == "error":
-                raise ReportFailureException(report)
-            sleep(interval)
-            report = self.get_report_status(report)
+        report = self._wait_for_report(report)
 
         if report.attachment is None or report.attachment.url is None:
             return
 
-        data = self._get_report_file(report.attachment.url)
+        path = _cached_report_file(report)
+        if path is not None:
+            with open(path, "rb") as f:
+                data = f.read().decode("utf-8")
+        else:
+            data = self._get_report_file(report.attachment.url)
 
         return data.split("\n")
 
+    def download_report(self, report, path_or_file):
+        """
+        Writes a completed report to the passed file path or binary file
+        object, as the attachment is downloaded.  Returns the number of
+        bytes written.
+        """
+        report = self._wait_for_report(report)
+
+        if report.attachment is None or report.attachment.url is None:
+            return 0
+
+        return _write_report_file(_iter_report_chunks(report), path_or_file)
+
+    def iter_report_rows(self, report, as_dict=False):
+        """
+        Returns an iterator over the csv rows of a completed report, as
+        lists, or as dicts keyed by the header row if as_dict is True.
+        The attachment is parsed as it is downloaded.
+        """
+        report = self._wait_for_report(report)
+
+        if report.attachment is None or report.attachment.url is None:
+            return iter([])
+
+        lines = _iter_lines(_iter_report_chunks(report))
+        return csv.DictReader(lines) if as_dict else csv.reader(lines)
+
+    def get_report_table(self, report, column_types=REPORT_COLUMN_TYPES,
+                         processes=None):
+        """
+        Returns a completed report as a ReportTable, with the known
+        provisioning and SIS export columns typed.  If processes is
+        passed, the report is downloaded to a file and parsed across
+        that many processes.
+        """
+        if processes is None:
+            return ReportTable.from_rows(self.iter_report_rows(report),
+                                         column_types=column_types)
+
+        report = self._wait_for_report(report)
+        path = _cached_report_file(report)
+        if path is not None:
+            return ReportTable.from_file(path, processes=processes,
+                                         column_types=column_types)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.csv")
+            _write_report_file(_iter_report_chunks(report), path)
+            return ReportTable.from_file(path, processes=processes,
+                                         column_types=column_types)
+
+    def get_report_store(self, report, path=None, keys=DEFAULT_REPORT_KEYS):
+        """
+        Returns a completed report as a ReportStore indexed by the key
+        columns.  The report is downloaded to path, or read from the report
+        cache, otherwise it is downloaded to a temporary file that is
+        removed when the store is closed.
+        """
+        report = self._wait_for_report(report)
+
+        if path is None:
+            path = _cached_report_file(report)
+            if path is not None:
+                return ReportStore(path, keys=keys)
+
+            fd, path = tempfile.mkstemp(suffix=".csv")
+            with os.fdopen(fd, "wb") as f:
+                _write_report_file(_iter_report_chunks(report), f)
+            return ReportStore(path, keys=keys, remove=True)
+
+        _write_report_file(_iter_report_chunks(report), path)
+        return ReportStore(path, keys=keys)
+
+    def wait_for_reports(self, reports, timeout=None, callback=None):
+        """
+        Waits for the passed reports to complete, polling their status
+        from a single loop, and returns the completed reports in order.
+        The callback is called with each polled report.  Raises
+        ReportFailureException if a report fails, or
+        ReportTimeoutException if timeout seconds pass first.
+        """
+        poller = ReportPoller(reports, timeout=timeout, callback=callback)
+        while not poller.is_done():
+            sleep(poller.next_delay())
+            for i in poller.due():
+                poller.update(i, self.get_report_status(poller.reports[i]))
+        return poller.reports
+
+    def _wait_for_report(self, report):
+        return self.wait_for_reports([report])[0]
+
+    def run_reports(self, specs, directory=None, max_running=None,
+                    delete=True, timeout=None, callback=None):
+        """
+        Creates a report for each spec, a dict of create_report arguments,
+        keeping at most max_running reports running at once.  Reports
+        are polled together, and each attachment is downloaded as its
+        report completes, to a file in directory if passed, otherwise as
+        a list of csv strings.  A spec with max_age reuses a recent
+        completed report, as create_report does.  Reports created here
+        are deleted once downloaded unless delete is False; reused
+        reports are left in place.
+
+        Returns a (report, data) tuple for each spec, in order, or the
+        ReportFailureException or DataFailureException for a report
+        that failed.
+        """
+        if max_running is None:
+            max_running = int(getattr(
+                settings, 'CANVAS_REPORT_MAX_RUNNING', 5))
+
+        pending = list(enumerate(specs))
+        spec_index = {}
+        results = [None] * len(pending)
+        downloads = {}
+        created = set()
+        poller = ReportPoller([], timeout=timeout, callback=callback)
+
+        def owned(report):
+            return delete and report.report_id in created
+
+        with ThreadPoolExecutor(max_workers=max_running) as pool:
+            def fetch(i):
+                report = poller.reports[i]
+                downloads[spec_index[i]] = pool.submit(
+                    self._fetch_report, report, directory, owned(report))
+
+            try:
+                while pending or not poller.is_done():
+                    while pending and len(poller.running()) < max_running:
+                        n, spec = pending.pop(0)
+                        try:
+                            i = poller.add(self._create_spec_report(
+                                spec, created))
+                        except DataFailureException as ex:
+                            results[n] = ex
+                            continue
+                        except ReportFailureException as ex:
+                            results[n] = ex
+                            if owned(ex.report):
+                                self._delete_failed_report(ex.report)
+                            continue
+                        spec_index[i] = n
+                        if poller.reports[i].status == "complete":
+                            fetch(i)
+
+                    if poller.is_done():
+                        continue
+
+                    sleep(poller.next_delay())
+                    for i in poller.due():
+                        try:
+                            poller.update(
+                                i, self.get_report_status(poller.reports[i]))
+                        except DataFailureException as ex:
+                            results[spec_index[i]] = ex
+                            poller.remove(i)
+                            if owned(poller.reports[i]):
+                                self._delete_failed_report(poller.reports[i])
+                            continue
+                        except ReportFailureException as ex:
+                            results[spec_index[i]] = ex
+                            if owned(ex.report):
+                                self._delete_failed_report(ex.report)
+                            continue
+
+                        if poller.reports[i].status == "complete":
+                            fetch(i)
+            except Exception:
+                for report in poller.running():
+                    if owned(report):
+                        self._delete_failed_report(report)
+                raise
+
+        for n, future in downloads.items():
+            try:
+                results[n] = future.result()
+            except (DataFailureException, ReportFailureException) as ex:
+                results[n] = ex
+        return results
+
+    def _create_spec_report(self, spec, created):
+        """
+        Returns a recent report for a run_reports spec with max_age, or
+        a new report, whose id is added to created.
+        """
+        spec = dict(spec)
+        max_age = spec.pop("max_age", None)
+        if max_age is not None:
+            report = self.get_recent_report(
+                spec["report_type"], spec["account_id"],
+                spec.get("term_id"), spec.get("params", {}), max_age=max_age)
+            if report is not None:
+                return report
+
+        report = self.create_report(**spec)
+        created.add(report.report_id)
+        return report
+
+    def _fetch_report(self, report, directory, delete):
+        try:
+            if report.attachment is None or report.attachment.url is None:
+                data = None
+            elif directory is not None:
+                data = os.path.join(directory, "{}_{}".format(
+                    report.report_id, report.attachment.filename))
+                _write_report_file(_iter_report_chunks(report), data)
+            else:
+                data = self._get_report_file(
+                    report.attachment.url).split("\n")
+        finally:
+            if delete:
+                self.delete_report(report)
+        return (report, data)
+
+    def _delete_failed_report(self, report):
+        try:
+            self.delete_report(report)
+        except DataFailureException:
+            pass
+
     def get_report_status(self, report):
         """
         Returns the status of a report.
@@ -186,3 +524,168 @@ class Reports(Canvas):
             raise DataFailureException(url, response.status, response.data)
 
         return response.data.decode("utf-8")
+
+
+def _report_parameters(params):
+    """
+    Returns report parameters normalized for comparison, ignoring unset
+    and false flags.
+    """
+    normalized = {}
+    for key, value in (params or {}).items():
+        value = str(value).lower()
+        if key != "extra_text" and value not in ("", "none", "false", "0"):
+            normalized[key] = "true" if value in ("1", "true") else value
+    return normalized
+
+
+def _iter_report_file(url, chunk_size=REPORT_CHUNK_SIZE):
+    """
+    Yields the report file at url in chunks of bytes.  The connection is
+    returned to the pool once the response is read to the end, and closed
+    if the consumer stops early.
+    """
+    response = CanvasFileDownload_DAO().streamURL(url)
+    complete = False
+    try:
+        if response.status != 200:
+            data = response.data
+            complete = True
+            raise DataFailureException(url, response.status, data)
+
+        if hasattr(response, "stream"):
+            yield from response.stream(chunk_size)
+        else:
+            yield response.data
+        complete = True
+    finally:
+        if not complete:
+            if hasattr(response, "close"):
+                response.close()
+        elif hasattr(response, "release_conn"):
+            response.release_conn()
+
+
+def _write_report_file(chunks, path_or_file):
+    """
+    Writes the chunks of a report file to the passed file path or binary
+    file object, returning the number of bytes written.
+    """
+    if isinstance(path_or_file, str):
+        with open(path_or_file, "wb") as f:
+            return _write_report_file(chunks, f)
+
+    size = 0
+    for chunk in chunks:
+        path_or_file.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def _cached_report_file(report):
+    """
+    Returns the path of the report attachment in the directory named by
+    the CANVAS_REPORT_CACHE_DIR setting, downloading it if not already
+    cached, or None if the setting is not set.
+    """
+    directory = getattr(settings, 'CANVAS_REPORT_CACHE_DIR', None)
+    if not directory:
+        return None
+
+    path = os.path.join(directory, "{}_{}_{}".format(
+        report.account_id, report.report_id, report.attachment.filename))
+    if not os.path.exists(path):
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                _write_report_file(
+                    _iter_report_file(report.attachment.url), f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    return path
+
+
+def _iter_report_chunks(report, chunk_size=REPORT_CHUNK_SIZE):
+    """
+    Yields the report attachment in chunks of bytes, from the report
+    cache if enabled.
+    """
+    path = _cached_report_file(report)
+    if path is None:
+        yield from _iter_report_file(report.attachment.url, chunk_size)
+        return
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+def _iter_lines(chunks):
+    """
+    Yields the newline terminated lines of utf-8 encoded chunks, leaving
+    quoted newlines for the csv reader to join.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class AsyncReports(AsyncCanvas):
+    """
+    Coroutine versions of the Reports methods.
+    """
+    _sync_class = Reports
+
+    get_available_reports = async_method(Reports.get_available_reports)
+    get_reports_by_type = async_method(Reports.get_reports_by_type)
+    create_report = async_method(Reports.create_report)
+    get_report_status = async_method(Reports.get_report_status)
+    delete_report = async_method(Reports.delete_report)
+
+    async def get_report_data(self, report):
+        """
+        Returns a completed report as a list of csv strings.
+        """
+        report = await self._wait_for_report(report)
+        return await self._run(Reports.get_report_data, self._sync, report)
+
+    async def download_report(self, report, path_or_file):
+        """
+        Writes a completed report to the passed file path or binary file
+        object, as the attachment is downloaded.  Returns the number of
+        bytes written.
+        """
+        report = await self._wait_for_report(report)
+        return await self._run(
+            Reports.download_report, self._sync, report, path_or_file)
+
+    async def wait_for_reports(self, reports, timeout=None, callback=None):
+        """
+        Waits for the passed reports to complete, polling the status of
+        the reports due at the same time concurrently, and returns the
+        completed reports in order.
+        """
+        poller = ReportPoller(reports, timeout=timeout, callback=callback)
+        while not poller.is_done():
+            await asyncio.sleep(poller.next_delay())
+            due = poller.due()
+            statuses = await asyncio.gather(*[
+                self.get_report_status(poller.reports[i]) for i in due])
+            for i, report in zip(due, statuses):
+                poller.update(i, report)
+        return poller.reports
+
+    async def _wait_for_report(self, report):
+        return (await self.wait_for_reports([report]))[0]
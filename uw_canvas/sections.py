@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas
+from uw_canvas import Canvas, AsyncCanvas, async_method, DEFAULT_BATCH_WORKERS
 from uw_canvas.courses import COURSES_API
 from uw_canvas.models import CanvasSection
 
@@ -26,6 +26,24 @@ class Sections(Canvas):
         return self.get_section(
             self._sis_id(sis_section_id, sis_field="section"), params)
 
+    def get_sections(self, section_ids, params={},
+                     max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Return a list of section resources for the passed canvas section ids,
+        in the same order.  A DataFailureException for a section is returned
+        in place of that section.
+        """
+        return self._get_batch(self.get_section, section_ids, params,
+                               max_workers=max_workers)
+
+    def get_sections_by_sis_ids(self, sis_section_ids, params={},
+                                max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Return a list of section resources for the passed sis ids.
+        """
+        return self._get_batch(self.get_section_by_sis_id, sis_section_ids,
+                               params, max_workers=max_workers)
+
     def get_sections_in_course(self, course_id, params={}):
         """
         Return list of sections for the passed course ID.
@@ -47,6 +65,18 @@ class Sections(Canvas):
         return self.get_sections_in_course(
             self._sis_id(sis_course_id, sis_field="course"), params)
 
+    def iter_sections_in_course(self, course_id, params={}):
+        """
+        Return an iterator over the sections for the passed course ID,
+        fetching pages as they are consumed.
+
+        https://canvas.instructure.com/doc/api/sections.html#method.sections.index
+        """
+        url = COURSES_API.format(course_id) + "/sections"
+
+        for data in self._iter_paged_resource(url, params=params):
+            yield CanvasSection(data=data)
+
     def get_sections_with_students_in_course(self, course_id, params={}):
         """
         Return list of sections including students for the passed course ID.
@@ -94,3 +124,18 @@ class Sections(Canvas):
             body["course_section"]["sis_section_id"] = sis_section_id
 
         return CanvasSection(data=self._put_resource(url, body))
+
+
+class AsyncSections(AsyncCanvas):
+    """
+    Coroutine versions of the Sections methods.
+    """
+    _sync_class = Sections
+
+    get_section = async_method(Sections.get_section)
+    get_section_by_sis_id = async_method(Sections.get_section_by_sis_id)
+    get_sections_in_course = async_method(Sections.get_sections_in_course)
+    get_sections_in_course_by_sis_id = async_method(
+        Sections.get_sections_in_course_by_sis_id)
+    create_section = async_method(Sections.create_section)
+    update_section = async_method(Sections.update_section)
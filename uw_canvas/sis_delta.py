@@ -0,0 +1,235 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Contains a local store of imported SIS rows, used to import only the rows
+of a SIS feed that changed since the last successful import.
+"""
+from uw_canvas.sis_import import CSV_FILES
+from hashlib import blake2b
+from threading import local
+import sqlite3
+import uuid
+import json
+import csv
+import os
+
+# Columns identifying a row of each csv file
+SIS_KEY_COLUMNS = {
+    "accounts.csv": ("account_id",),
+    "users.csv": ("user_id",),
+    "terms.csv": ("term_id",),
+    "courses.csv": ("course_id",),
+    "sections.csv": ("section_id",),
+    "enrollments.csv": ("course_id", "section_id", "user_id", "role",
+                        "role_id"),
+    "xlists.csv": ("xlist_course_id", "section_id"),
+    "admins.csv": ("user_id", "account_id", "role", "role_id"),
+}
+ACTIVE_STATUS = "active"
+DELETED_STATUS = "deleted"
+# Rows written to the staging table at a time while diffing
+STAGE_BATCH_SIZE = 1000
+
+
+class SISImportState(object):
+    """
+    The key and hash of each row last imported from a SIS feed, by csv
+    file, stored in the SQLite database file at path.  Rows found by a
+    diff are staged in the same file, by delta id, until the delta is
+    committed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sis_row ("
+                "filename TEXT, key TEXT, hash BLOB, row TEXT, "
+                "PRIMARY KEY (filename, key))")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sis_row_pending ("
+                "delta_id TEXT, filename TEXT, key TEXT, hash BLOB, "
+                "row TEXT, PRIMARY KEY (delta_id, filename, key))")
+
+    def count(self, filename=None):
+        """
+        Returns the number of stored rows, for the csv file or all files.
+        """
+        with self._connection() as conn:
+            if filename is None:
+                return conn.execute(
+                    "SELECT COUNT(*) FROM sis_row").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM sis_row WHERE filename = ?",
+                (filename,)).fetchone()[0]
+
+    def clear(self, filename=None):
+        """
+        Removes the stored and staged rows, for the csv file or all
+        files, so that the next delta imports every row.
+        """
+        with self._connection() as conn:
+            if filename is None:
+                conn.execute("DELETE FROM sis_row")
+                conn.execute("DELETE FROM sis_row_pending")
+            else:
+                conn.execute("DELETE FROM sis_row WHERE filename = ?",
+                             (filename,))
+                conn.execute(
+                    "DELETE FROM sis_row_pending WHERE filename = ?",
+                    (filename,))
+
+    def diff(self, dir_path, out_path, full=False):
+        """
+        Compares the csv files in dir_path with the stored rows, writing
+        the added and changed rows, and the removed rows with a deleted
+        status, to csv files of the same name in out_path.  If full is
+        True, every row is written.  Returns a SISImportDelta, to be
+        committed once the import succeeds.
+        """
+        delta = SISImportDelta(self)
+        for filename in CSV_FILES:
+            path = os.path.join(dir_path, filename)
+            if os.path.exists(path):
+                self._diff_file(filename, path,
+                                os.path.join(out_path, filename), full, delta)
+        return delta
+
+    def _diff_file(self, filename, path, out_path, full, delta):
+        with self._connection() as conn:
+            hashes = dict(conn.execute(
+                "SELECT key, hash FROM sis_row WHERE filename = ?",
+                (filename,)))
+
+        stats = delta.stats[filename] = {
+            "added": 0, "changed": 0, "deleted": 0, "unchanged": 0}
+        pending = []
+
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            key_columns = [header.index(name) if name in header else None
+                           for name in SIS_KEY_COLUMNS.get(filename, ())]
+            padding = [] if "status" in header else [ACTIVE_STATUS]
+            columns = header + (["status"] if padding else [])
+
+            with open(out_path, "w", newline="", encoding="utf-8") as out:
+                writer = csv.writer(out)
+                writer.writerow(columns)
+                written = 0
+                for row in reader:
+                    if not row:
+                        continue
+                    key = _row_key(row, key_columns)
+                    digest = _row_hash(header, row)
+                    old = hashes.pop(key, None)
+                    if old == digest:
+                        stats["unchanged"] += 1
+                        if not full:
+                            continue
+                    else:
+                        stats["added" if old is None else "changed"] += 1
+                        pending.append((delta.delta_id, filename, key, digest,
+                                        json.dumps(dict(zip(header, row)))))
+                        if len(pending) >= STAGE_BATCH_SIZE:
+                            self._stage(pending)
+                            pending = []
+                    writer.writerow(row + padding)
+                    written += 1
+
+                for key, values in self._rows(filename, hashes):
+                    values["status"] = DELETED_STATUS
+                    writer.writerow([values.get(name, "") for name in columns])
+                    written += 1
+                stats["deleted"] = len(hashes)
+                pending.extend((delta.delta_id, filename, key, None, None)
+                               for key in hashes)
+                self._stage(pending)
+
+        if not written:
+            os.remove(out_path)
+
+    def _rows(self, filename, keys):
+        with self._connection() as conn:
+            for key in keys:
+                row = conn.execute(
+                    "SELECT row FROM sis_row WHERE filename = ? AND key = ?",
+                    (filename, key)).fetchone()
+                yield key, json.loads(row[0])
+
+    def _stage(self, rows):
+        """
+        Stages (delta_id, filename, key, hash, row) tuples, where a row
+        of None marks a removed row.
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sis_row_pending "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _commit(self, delta_id):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sis_row "
+                "SELECT filename, key, hash, row FROM sis_row_pending "
+                "WHERE delta_id = ? AND row IS NOT NULL", (delta_id,))
+            conn.execute(
+                "DELETE FROM sis_row WHERE EXISTS ("
+                "SELECT 1 FROM sis_row_pending p WHERE p.delta_id = ? AND "
+                "p.row IS NULL AND p.filename = sis_row.filename AND "
+                "p.key = sis_row.key)", (delta_id,))
+            conn.execute("DELETE FROM sis_row_pending WHERE delta_id = ?",
+                         (delta_id,))
+
+    def _discard(self, delta_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sis_row_pending WHERE delta_id = ?",
+                         (delta_id,))
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+
+class SISImportDelta(object):
+    """
+    The rows added, changed and deleted in a SIS feed since the last
+    committed import, staged in the state by delta_id, with counts by
+    csv file in stats.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.delta_id = uuid.uuid4().hex
+        self.stats = {}
+
+    def has_changes(self):
+        return any(stats["added"] or stats["changed"] or stats["deleted"]
+                   for stats in self.stats.values())
+
+    def commit(self):
+        """
+        Records the feed rows in the state, once Canvas has imported them.
+        """
+        self.state._commit(self.delta_id)
+
+    def discard(self):
+        """
+        Drops the staged rows, if the import failed.
+        """
+        self.state._discard(self.delta_id)
+
+
+def _row_key(row, key_columns):
+    return "\x1f".join(
+        row[i] if i is not None and i < len(row) else ""
+        for i in key_columns)
+
+
+def _row_hash(header, row):
+    return blake2b(json.dumps(sorted(zip(header, row))).encode("utf-8"),
+                   digest_size=16).digest()
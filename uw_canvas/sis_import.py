@@ -7,9 +7,13 @@ from uw_canvas.accounts import ACCOUNTS_API
 from uw_canvas.models import SISImport as SISImportModel
 from uw_canvas.models import SISImportError as SISImportErrorModel
 from uw_canvas.dao import Canvas_DAO
+from uw_canvas.poller import StatusPoller
 from restclients_core.exceptions import DataFailureException
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from time import sleep
 import zipfile
 import json
+import io
 import os
 
 
@@ -17,40 +21,64 @@ import os
 CSV_FILES = ["accounts.csv", "users.csv", "terms.csv", "courses.csv",
              "sections.csv", "enrollments.csv", "xlists.csv", "admins.csv"]
 SIS_IMPORTS_API = ACCOUNTS_API + "/sis_imports"
+UPLOAD_CHUNK_SIZE = 65536
+DIFFING_DROP_STATUSES = ("deleted", "completed", "inactive")
+IMPORTED_STATES = ("imported", "imported_with_messages", "restored",
+                   "partially_restored")
+FAILED_STATES = ("failed", "failed_with_messages")
+FINISHED_STATES = IMPORTED_STATES + FAILED_STATES + ("aborted",)
+
+
+class SISImportTimeoutException(Exception):
+    """
+    This exception means SIS imports did not finish before the deadline.
+    """
+    def __init__(self, sis_imports):
+        self.sis_imports = sis_imports
+
+    def __str__(self):
+        return ("Timed out waiting for SIS imports {}".format(
+            ", ".join(str(i.import_id) for i in self.sis_imports)))
+
+
+class SISImportPoller(StatusPoller):
+    """
+    Schedules status polls for a set of SIS imports, bounded by the
+    CANVAS_SIS_IMPORT_POLLING_INTERVAL and
+    CANVAS_SIS_IMPORT_POLLING_MAX_INTERVAL settings.
+    """
+    settings_prefix = "CANVAS_SIS_IMPORT_POLLING"
+
+    @property
+    def sis_imports(self):
+        return self.jobs
+
+    def _is_finished(self, sis_import):
+        return sis_import.workflow_state in FINISHED_STATES
+
+    def _timeout_exception(self):
+        return SISImportTimeoutException(self.running())
 
 
 class SISImport(Canvas):
     def import_str(self, csv, params={}):
         """
-        Imports a CSV string.
+        Imports a CSV file, given as a string, bytes, a file object, a
+        path, or an iterator of string or byte chunks.
 
         https://canvas.instructure.com/doc/api/sis_imports.html#method.sis_imports_api.create
         """
-        if not self._canvas_account_id:
-            raise MissingAccountID()
-
-        params["import_type"] = SISImportModel.CSV_IMPORT_TYPE
-        url = SIS_IMPORTS_API.format(
-            self._canvas_account_id) + ".json{}".format(self._params(params))
-        headers = {"Content-Type": "text/csv"}
-
-        return SISImportModel(data=self._post_resource(url, headers, csv))
+        return self._create_import(csv, "text/csv", params)
 
     def import_archive(self, archive, params={}):
         """
-        Imports a zip archive of CSV files.
+        Imports a zip archive of CSV files, given as bytes, a file object
+        positioned at the start of the archive, a path, or an iterator of
+        byte chunks.
 
         https://canvas.instructure.com/doc/api/sis_imports.html#method.sis_imports_api.create
         """
-        if not self._canvas_account_id:
-            raise MissingAccountID()
-
-        params["import_type"] = SISImportModel.CSV_IMPORT_TYPE
-        url = SIS_IMPORTS_API.format(
-            self._canvas_account_id) + ".json{}".format(self._params(params))
-        headers = {"Content-Type": "application/zip"}
-
-        return SISImportModel(data=self._post_resource(url, headers, archive))
+        return self._create_import(archive, "application/zip", params)
 
     def import_dir(self, dir_path, params={}):
         """
@@ -58,8 +86,96 @@ class SISImport(Canvas):
 
         https://canvas.instructure.com/doc/api/sis_imports.html#method.sis_imports_api.create
         """
-        archive = self._build_archive(dir_path)
-        return self.import_archive(archive, params)
+        with self._build_archive(dir_path) as archive:
+            return self.import_archive(archive, params)
+
+    def import_delta(self, dir_path, state, params={}, full=False):
+        """
+        Imports the rows of a directory of CSV files that were added,
+        changed or removed since the last import committed to state, a
+        uw_canvas.sis_delta.SISImportState.  Removed rows are imported
+        with a deleted status.  If full is True, every row is imported.
+
+        Returns the SISImport, or None if nothing changed, and the
+        SISImportDelta, which should be committed once the import has
+        succeeded, or discarded if it failed.
+        """
+        with TemporaryDirectory() as out_path:
+            delta = state.diff(dir_path, out_path, full=full)
+            if not (full or delta.has_changes()):
+                return None, delta
+            try:
+                return self.import_dir(out_path, params), delta
+            except Exception:
+                delta.discard()
+                raise
+
+    def diffing_params(self, data_set_identifier=None, sis_term_id=None,
+                       drop_status=None, remaster=False,
+                       change_threshold=None, params={}):
+        """
+        Returns import params that have Canvas import only the rows that
+        differ from the last import of the data set, identified by
+        data_set_identifier or derived from sis_term_id.  Rows missing
+        from the import are set to drop_status, one of
+        DIFFING_DROP_STATUSES.  Diffing is skipped if more than
+        change_threshold percent of the rows changed.
+
+        https://canvas.instructure.com/doc/api/sis_imports.html#method.sis_imports_api.create
+        """
+        if data_set_identifier is None:
+            if sis_term_id is None:
+                raise ValueError("data_set_identifier or sis_term_id required")
+            data_set_identifier = self.term_data_set_identifier(sis_term_id)
+
+        params = dict(params)
+        params["diffing_data_set_identifier"] = data_set_identifier
+        if drop_status is not None:
+            if drop_status not in DIFFING_DROP_STATUSES:
+                raise ValueError(
+                    "Invalid diffing_drop_status: {}".format(drop_status))
+            params["diffing_drop_status"] = drop_status
+        if remaster:
+            params["diffing_remaster_data_set"] = "true"
+        return self._threshold_params(params, change_threshold)
+
+    def batch_mode_params(self, term_id=None, sis_term_id=None,
+                          change_threshold=None, params={}):
+        """
+        Returns import params that have Canvas delete the term's objects
+        missing from the import, for the term given by its Canvas or SIS
+        id.  Deletes are skipped if more than change_threshold percent of
+        the term's objects would be deleted.
+
+        https://canvas.instructure.com/doc/api/sis_imports.html#method.sis_imports_api.create
+        """
+        if term_id is None:
+            if sis_term_id is None:
+                raise ValueError("term_id or sis_term_id required")
+            term_id = "sis_term_id:{}".format(sis_term_id)
+
+        params = dict(params)
+        params["batch_mode"] = "true"
+        params["batch_mode_term_id"] = term_id
+        return self._threshold_params(params, change_threshold)
+
+    def term_data_set_identifier(self, sis_term_id, prefix=None):
+        """
+        Returns a diffing data set identifier for the term's imports,
+        unique to the account unless prefix is passed.
+        """
+        if prefix is None:
+            prefix = "account-{}".format(self._canvas_account_id)
+        return "{}-{}".format(prefix, sis_term_id)
+
+    def _threshold_params(self, params, change_threshold):
+        if change_threshold is not None:
+            change_threshold = int(change_threshold)
+            if not 1 <= change_threshold <= 100:
+                raise ValueError(
+                    "Invalid change_threshold: {}".format(change_threshold))
+            params["change_threshold"] = change_threshold
+        return params
 
     def get_import_status(self, sis_import):
         """
@@ -75,6 +191,34 @@ class SISImport(Canvas):
 
         return SISImportModel(data=self._get_resource(url))
 
+    def wait_for_imports(self, sis_imports, timeout=None, callback=None):
+        """
+        Waits for the passed SIS imports to finish, polling their status
+        from a single loop, and returns the finished imports in order.
+        The errors of failed imports are fetched into their errors
+        attribute.  The callback is called with each import as it
+        finishes.  Raises SISImportTimeoutException if timeout seconds
+        pass first.
+        """
+        poller = SISImportPoller(sis_imports, timeout=timeout)
+        for sis_import in poller.sis_imports:
+            if sis_import.workflow_state in FINISHED_STATES:
+                self._finish_import(sis_import, callback)
+
+        while not poller.is_done():
+            sleep(poller.next_delay())
+            for i in poller.due():
+                sis_import = self.get_import_status(poller.sis_imports[i])
+                if poller.update(i, sis_import):
+                    self._finish_import(sis_import, callback)
+        return poller.sis_imports
+
+    def _finish_import(self, sis_import, callback):
+        if sis_import.workflow_state in FAILED_STATES:
+            sis_import.errors = self.get_import_errors(sis_import)
+        if callback is not None:
+            callback(sis_import)
+
     def get_imports(self, params={}):
         """
         Get Canvas sis imports
@@ -110,6 +254,23 @@ class SISImport(Canvas):
 
         return [SISImportErrorModel(data=data) for data in errors]
 
+    def _create_import(self, body, content_type, params):
+        if not self._canvas_account_id:
+            raise MissingAccountID()
+
+        params["import_type"] = SISImportModel.CSV_IMPORT_TYPE
+        url = SIS_IMPORTS_API.format(
+            self._canvas_account_id) + ".json{}".format(self._params(params))
+        headers = {"Content-Type": content_type}
+
+        if isinstance(body, os.PathLike):
+            with open(body, "rb") as f:
+                return SISImportModel(data=self._post_resource(
+                    url, headers, _upload_body(f, headers)))
+
+        return SISImportModel(data=self._post_resource(
+            url, headers, _upload_body(body, headers)))
+
     def _post_resource(self, url, headers, body):
         headers.update({"Accept": "application/json",
                         "Connection": "keep-alive"})
@@ -125,22 +286,27 @@ class SISImport(Canvas):
 
     def _build_archive(self, dir_path):
         """
-        Creates a zip archive from files in path.
+        Creates a zip archive from files in path, returned as a file object
+        that is kept in memory up to SIS_IMPORT_SPOOL_SIZE bytes, and in a
+        temporary file beyond that.
         """
-        zip_path = os.path.join(dir_path, "import.zip")
-        archive = zipfile.ZipFile(zip_path, "w")
-
-        for filename in CSV_FILES:
-            filepath = os.path.join(dir_path, filename)
-
-            if os.path.exists(filepath):
-                archive.write(filepath, filename, zipfile.ZIP_DEFLATED)
-
-        archive.close()
-
-        with open(zip_path, "rb") as f:
-            body = f.read()
-
+        spool_size = int(self._DAO.get_service_setting(
+            "SIS_IMPORT_SPOOL_SIZE", 10485760))
+        compresslevel = self._DAO.get_service_setting(
+            "SIS_IMPORT_COMPRESSLEVEL")
+        if compresslevel is not None:
+            compresslevel = int(compresslevel)
+
+        body = SpooledTemporaryFile(max_size=spool_size)
+        with zipfile.ZipFile(body, "w", zipfile.ZIP_DEFLATED,
+                             compresslevel=compresslevel) as archive:
+            for filename in CSV_FILES:
+                filepath = os.path.join(dir_path, filename)
+
+                if os.path.exists(filepath):
+                    archive.write(filepath, filename)
+
+        body.seek(0)
         return body
 
     def delete_import(self, sis_import):
@@ -170,3 +336,48 @@ class SISImport(Canvas):
             self._canvas_account_id) + "/abort_all_pending"
 
         return self._put_resource(url)
+
+
+def _upload_body(body, headers):
+    """
+    Returns the request body to send for an import body, adding framing
+    headers to headers.  Seekable binary files are sent with their
+    Content-Length, other files and chunk iterators are streamed with
+    chunked transfer encoding.
+    """
+    if isinstance(body, (str, bytes, bytearray)) or body is None:
+        return body
+
+    if hasattr(body, "read"):
+        if not isinstance(body, io.TextIOBase) and _seekable(body):
+            start = body.tell()
+            headers["Content-Length"] = str(
+                body.seek(0, os.SEEK_END) - start)
+            body.seek(start)
+            return body
+        f = body
+        body = iter(lambda: f.read(UPLOAD_CHUNK_SIZE), f.read(0))
+
+    headers["Transfer-Encoding"] = "chunked"
+    return _encode_chunks(body)
+
+
+def _seekable(f):
+    """
+    Returns True if f can seek, probing with tell and seek since not
+    every file object, such as SpooledTemporaryFile before Python 3.11,
+    has a seekable method.
+    """
+    try:
+        f.seek(f.tell())
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _encode_chunks(chunks):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if chunk:
+            yield chunk
@@ -61,3 +61,23 @@ class Submissions(Canvas):
         for submission in data:
             submissions.append(Submission(data=submission))
         return submissions
+
+    def iter_submissions_multiple_assignments(
+            self, is_section, course_id, students=None, assignments=None,
+            **params):
+        """
+        Return an iterator over submissions for multiple assignments by
+        course/section id and optionally student, fetching pages as they
+        are consumed.
+
+        https://canvas.instructure.com/doc/api/submissions.html#method.submissions_api.for_students
+        """
+        api = SECTIONS_API if is_section else COURSES_API
+        if students is not None:
+            params['student_ids'] = students
+        if assignments is not None:
+            params['assignment_ids'] = assignments
+
+        url = api.format(course_id) + "/students/submissions"
+        for submission in self._iter_paged_resource(url, params=params):
+            yield Submission(data=submission)
@@ -2,12 +2,75 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+from commonconf import settings
+from restclients_core.exceptions import DataFailureException
 from uw_canvas import Canvas, MissingAccountID
 from uw_canvas.accounts import ACCOUNTS_API
 from uw_canvas.models import CanvasTerm
+from bisect import bisect_right
+from datetime import timezone
+from threading import Lock
+import time
+
+
+class TermIndex(object):
+    """
+    An index of terms by SIS ID, term ID and date range.
+    """
+    def __init__(self, terms, ttl=None):
+        self.expires = None if ttl is None else time.time() + ttl
+        self._by_sis_id = {}
+        self._by_id = {}
+        dated = []
+        for term in terms:
+            self._by_id[term.term_id] = term
+            if term.sis_term_id:
+                self._by_sis_id[term.sis_term_id] = term
+            if (term.start_at is not None and term.end_at is not None and
+                    term.workflow_state != "deleted"):
+                dated.append(term)
+
+        dated.sort(key=lambda t: t.start_at)
+        self._dated = dated
+        self._starts = [term.start_at for term in dated]
+
+        # Latest end date of the terms starting at or before each position,
+        # bounding the backward scan for overlapping terms
+        self._max_ends = []
+        for term in dated:
+            if self._max_ends and self._max_ends[-1] > term.end_at:
+                self._max_ends.append(self._max_ends[-1])
+            else:
+                self._max_ends.append(term.end_at)
+
+    def is_expired(self):
+        return self.expires is not None and self.expires <= time.time()
+
+    def get_by_sis_id(self, sis_term_id):
+        return self._by_sis_id.get(sis_term_id)
+
+    def get_by_id(self, term_id):
+        return self._by_id.get(int(term_id))
+
+    def get_for_date(self, date):
+        """
+        Return the latest starting term whose date range contains the
+        passed datetime, naive datetimes are taken to be UTC.
+        """
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+
+        i = bisect_right(self._starts, date) - 1
+        while i >= 0 and self._max_ends[i] >= date:
+            if self._dated[i].end_at >= date:
+                return self._dated[i]
+            i -= 1
 
 
 class Terms(Canvas):
+    _term_indexes = {}
+    _term_indexes_lock = Lock()
+
     def get_all_terms(self):
         """
         Return all of the terms in the account.
@@ -24,16 +87,77 @@ class Terms(Canvas):
         response = self._get_paged_resource(url, params, data_key)
         for data in response[data_key]:
             terms.append(CanvasTerm(data=data))
+
+        self._set_term_index(TermIndex(terms, ttl=self._term_index_ttl()))
         return terms
 
     def get_term_by_sis_id(self, sis_term_id):
         """
-        Return a term resource for the passed SIS ID.
+        Return a term resource for the passed SIS ID, from the term index
+        if loaded and it has the term, otherwise from the single term API,
+        so that terms created since the index was loaded are found.
+        https://canvas.instructure.com/doc/api/enrollment_terms.html#method.terms_api.show
         """
-        for term in self.get_all_terms():
-            if term.sis_term_id == sis_term_id:
+        index = self._cached_term_index()
+        if index is not None:
+            term = index.get_by_sis_id(sis_term_id)
+            if term is not None:
                 return term
 
+        if not self._canvas_account_id:
+            raise MissingAccountID()
+
+        url = ACCOUNTS_API.format(
+            self._canvas_account_id) + "/terms/{}".format(
+                self._sis_id(sis_term_id, sis_field='term'))
+        try:
+            return CanvasTerm(data=self._get_resource(url))
+        except DataFailureException as err:
+            if err.status == 404:
+                return None
+            raise
+
+    def get_term_by_id(self, term_id):
+        """
+        Return a term resource for the passed Canvas term ID.
+        """
+        return self.get_term_index().get_by_id(term_id)
+
+    def get_term_for_date(self, date):
+        """
+        Return the term whose date range contains the passed datetime.
+        """
+        return self.get_term_index().get_for_date(date)
+
+    def get_term_index(self):
+        """
+        Return the TermIndex for the account, loading all terms if the
+        index is not loaded or has expired.
+        """
+        index = self._cached_term_index()
+        if index is None:
+            self.get_all_terms()
+            index = self._cached_term_index()
+        return index
+
+    def _term_index_key(self):
+        return (self._DAO.get_service_setting("HOST"),
+                self._canvas_account_id)
+
+    def _term_index_ttl(self):
+        return int(getattr(
+            settings, 'RESTCLIENTS_CANVAS_TERM_INDEX_TTL', 3600))
+
+    def _cached_term_index(self):
+        with Terms._term_indexes_lock:
+            index = Terms._term_indexes.get(self._term_index_key())
+        if index is not None and not index.is_expired():
+            return index
+
+    def _set_term_index(self, index):
+        with Terms._term_indexes_lock:
+            Terms._term_indexes[self._term_index_key()] = index
+
     def update_term_overrides(self, sis_term_id, overrides={}):
         """
         Update an existing enrollment term for the passed SIS ID.
@@ -47,4 +171,8 @@ class Terms(Canvas):
                 self._sis_id(sis_term_id, sis_field='term'))
 
         body = {'enrollment_term': {'overrides': overrides}}
-        return CanvasTerm(data=self._put_resource(url, body))
+        term = CanvasTerm(data=self._put_resource(url, body))
+
+        with Terms._term_indexes_lock:
+            Terms._term_indexes.pop(self._term_index_key(), None)
+        return term
@@ -5,9 +5,10 @@
 from unittest import TestCase
 from commonconf import settings
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.accounts import Accounts as Canvas
+from uw_canvas.accounts import Accounts as Canvas, AsyncAccounts
 from uw_canvas.models import CanvasSSOSettings
 from restclients_core.exceptions import DataFailureException
+import asyncio
 import mock
 
 
@@ -100,3 +101,24 @@ class CanvasTestAccounts(TestCase):
                     'change_password_url': None,
                     'auth_discovery_url': None,
                     'unknown_user_url': 'https://test.edu/unknown'}})
+
+
+@fdao_canvas_override
+class CanvasTestAsyncAccounts(TestCase):
+    def test_account(self):
+        canvas = AsyncAccounts()
+
+        account = asyncio.run(
+            canvas.get_account_by_sis_id('uwcourse:seattle:cse:cse'))
+        self.assertEqual(account.account_id, 696969)
+        self.assertEqual(account.sis_account_id, 'uwcourse:seattle:cse:cse')
+
+    def test_sub_account(self):
+        canvas = AsyncAccounts()
+
+        accounts = asyncio.run(
+            canvas.get_sub_accounts_by_sis_id('uwcourse:seattle:cse'))
+        self.assertEqual(
+            [a.account_id for a in accounts],
+            [a.account_id for a in Canvas().get_sub_accounts_by_sis_id(
+                'uwcourse:seattle:cse')])
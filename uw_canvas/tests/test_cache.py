@@ -0,0 +1,255 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from unittest import TestCase
+from commonconf import override_settings
+from restclients_core.models import MockHTTP
+from uw_canvas.cache import (
+    LRUCache, TTLCache, ResponseCache, SQLiteResponseCache)
+from tempfile import TemporaryDirectory
+import sqlite3
+import mock
+import stat
+import os
+
+
+class CanvasTestLRUCache(TestCase):
+    def test_get_set(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 1), 1)
+
+        cache.set('a', 'A')
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        cache.delete('a')
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')
+        cache.set('c', 'C')
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class CanvasTestTTLCache(TestCase):
+    @mock.patch('uw_canvas.cache.time.time')
+    def test_expiry(self, mock_time):
+        mock_time.return_value = 100
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 'A', 10)
+        self.assertEqual(cache.get('a'), 'A')
+
+        mock_time.return_value = 111
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_max_bytes(self):
+        cache = TTLCache(maxsize=10, max_bytes=10)
+        cache.set('a', 'A', 60, size=6)
+        cache.set('b', 'B', 60, size=4)
+        self.assertEqual(cache.bytes, 10)
+
+        cache.set('c', 'C', 60, size=5)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 'B')
+        self.assertEqual(cache.bytes, 9)
+
+        cache.delete('b')
+        self.assertEqual(cache.bytes, 5)
+        cache.clear()
+        self.assertEqual(cache.bytes, 0)
+
+
+class CanvasTestResponseCache(TestCase):
+    def response(self, data):
+        response = MockHTTP()
+        response.status = 200
+        response.data = data
+        return response
+
+    def test_ttl(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.ttl('/api/v1/accounts/1'), 3600)
+        self.assertEqual(cache.ttl('/api/v1/accounts/1/terms?x=1'), 3600)
+        self.assertIsNone(cache.ttl('/api/v1/accounts/1/courses'))
+        self.assertIsNone(cache.ttl('/api/v1/courses/1'))
+        self.assertIsNone(cache.ttl('/api/v1/accounts/1/developer_keys'))
+
+        with override_settings(RESTCLIENTS_CANVAS_CACHE_TTLS={
+                r'^/api/v1/courses/': 60}):
+            cache = ResponseCache()
+            self.assertEqual(cache.ttl('/api/v1/courses/1'), 60)
+            self.assertIsNone(cache.ttl('/api/v1/accounts/1'))
+
+    def test_get_set(self):
+        cache = ResponseCache()
+        cache.set('host', '/api/v1/courses/1', self.response('{}'))
+        self.assertIsNone(cache.get('host', '/api/v1/courses/1'))
+
+        response = self.response('{}')
+        cache.set('host', '/api/v1/accounts/1', response)
+        self.assertEqual(cache.get('host', '/api/v1/accounts/1'), response)
+        self.assertIsNone(cache.get('other', '/api/v1/accounts/1'))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        for url in ['/api/v1/accounts/1', '/api/v1/accounts/1/roles',
+                    '/api/v1/accounts/1/roles?page=2',
+                    '/api/v1/accounts/12/roles']:
+            cache.set('host', url, self.response('{}'))
+
+        cache.invalidate('host', '/api/v1/accounts/1/roles/3?as_user_id=x')
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1/roles'))
+        self.assertIsNone(
+            cache.get('host', '/api/v1/accounts/1/roles?page=2'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/12/roles'))
+
+    def test_credential(self):
+        cache = ResponseCache()
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'), 'a')
+        cache.set('host', '/api/v1/accounts/2', self.response('{}'), 'b')
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/1', 'a'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'b'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'), 'b')
+        cache.invalidate('host', '/api/v1/accounts/1')
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'a'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'b'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/2', 'b'))
+
+
+class CanvasTestSQLiteResponseCache(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def cache(self, **kwargs):
+        with override_settings(RESTCLIENTS_CANVAS_CACHE_PATH=self.path,
+                               **kwargs):
+            return SQLiteResponseCache()
+
+    def response(self, data):
+        response = MockHTTP()
+        response.status = 200
+        response.data = data
+        response.headers = {'Link': '<x>; rel="next"'}
+        return response
+
+    def test_get_set(self):
+        self.cache().set('host', '/api/v1/accounts/1', self.response('{}'))
+
+        cache = self.cache()
+        response = cache.get('host', '/api/v1/accounts/1')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, '{}')
+        self.assertEqual(response.getheader('Link'), '<x>; rel="next"')
+        self.assertIsNone(
+            cache.get('host', '/api/v1/accounts/1?as_user_id=x'))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+        cache.set('host', '/api/v1/courses/1', self.response('{}'))
+        self.assertIsNone(cache.get('host', '/api/v1/courses/1'))
+
+    @mock.patch('uw_canvas.cache.time.time')
+    def test_expiry(self, mock_time):
+        mock_time.return_value = 100
+        cache = self.cache()
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/1'))
+
+        mock_time.return_value = 3701
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+
+    @mock.patch('uw_canvas.cache.time.time')
+    def test_eviction(self, mock_time):
+        cache = self.cache(RESTCLIENTS_CANVAS_CACHE_SIZE=2,
+                           RESTCLIENTS_CANVAS_CACHE_MAX_BYTES=10)
+        for i, url in enumerate(['/api/v1/accounts/1', '/api/v1/accounts/2',
+                                 '/api/v1/accounts/3']):
+            mock_time.return_value = 100 + i
+            cache.set('host', url, self.response('{}'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/3'))
+
+        mock_time.return_value = 110
+        cache.set('host', '/api/v1/accounts/4', self.response('x' * 9))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/3'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/4'))
+
+    def test_invalidate(self):
+        cache = self.cache()
+        for url in ['/api/v1/accounts/1', '/api/v1/accounts/1/roles',
+                    '/api/v1/accounts/12/roles']:
+            cache.set('host', url, self.response('{}'))
+
+        cache.invalidate('host', '/api/v1/accounts/1/roles')
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1/roles'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/12/roles'))
+
+        cache.clear()
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/12/roles'))
+
+    def test_credential(self):
+        cache = self.cache()
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'), 'a')
+        cache.set('host', '/api/v1/accounts/2', self.response('{}'), 'b')
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/1', 'a'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'b'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'), 'b')
+        cache.invalidate('host', '/api/v1/accounts/1')
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'a'))
+        self.assertIsNone(cache.get('host', '/api/v1/accounts/1', 'b'))
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/2', 'b'))
+
+    def test_permissions(self):
+        self.cache()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_default_path(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmpdir.name}):
+            cache = SQLiteResponseCache()
+        path = os.path.join(self.tmpdir.name, 'uw_canvas')
+        self.assertEqual(cache.path,
+                         os.path.join(path, 'uw_canvas_cache.sqlite3'))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(cache.path).st_mode), 0o600)
+
+    def test_sqlite_error(self):
+        cache = self.cache()
+        cache.set('host', '/api/v1/accounts/1', self.response('{}'))
+        with mock.patch.object(SQLiteResponseCache, '_connection',
+                               side_effect=sqlite3.OperationalError('locked')):
+            self.assertIsNone(cache.get('host', '/api/v1/accounts/1'))
+            cache.set('host', '/api/v1/accounts/2', self.response('{}'))
+            cache.invalidate('host', '/api/v1/accounts/1')
+            cache.clear()
+        self.assertEqual(cache.misses, 1)
+        self.assertIsNotNone(cache.get('host', '/api/v1/accounts/1'))
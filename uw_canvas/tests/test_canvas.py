@@ -4,7 +4,14 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas import Canvas, Canvas_DAO
+from commonconf import override_settings
+from uw_canvas import Canvas, AsyncCanvas, Canvas_DAO
+from restclients_core.models import MockHTTP
+from restclients_core.exceptions import DataFailureException
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Event
+from time import sleep
+import asyncio
 import mock
 
 
@@ -63,9 +70,283 @@ class CanvasTestCanvas(TestCase):
             canvas._params(params),
             '?per_page=100&search_term=19th%20Century%20Poets')
 
+    def test_get_paged_resource(self):
+        canvas = Canvas()
+
+        roles = canvas._get_paged_resource('/api/v1/accounts/12345/roles')
+        self.assertEqual(len(roles), 15)
+        self.assertEqual(canvas.next_page_url, None)
+
+        roles = canvas._get_paged_resource(
+            '/api/v1/accounts/12345/roles', {'page': 2, 'per_page': 10})
+        self.assertEqual(len(roles), 5)
+
+    def test_iter_paged_resource(self):
+        canvas = Canvas()
+
+        with mock.patch.object(Canvas, '_get_response',
+                               wraps=canvas._get_response) as mock_get:
+            roles = canvas._iter_paged_resource('/api/v1/accounts/12345/roles')
+            self.assertEqual(mock_get.call_count, 0)
+
+            first = next(roles)
+            self.assertEqual(first['role'], 'AccountAdmin')
+            self.assertEqual(mock_get.call_count, 1)
+
+            self.assertEqual(len(list(roles)), 14)
+            self.assertEqual(mock_get.call_count, 2)
+            mock_get.assert_called_with(
+                '/api/v1/accounts/12345/roles?page=2&per_page=10')
+
+        roles = canvas._iter_paged_resource(
+            '/api/v1/accounts/12345/roles', {'page': 2, 'per_page': 10})
+        self.assertEqual(len(list(roles)), 5)
+
+        with mock.patch.object(Canvas, '_iter_resource_url') as mock_iter:
+            canvas._iter_paged_resource(
+                '/api/v1/accounts/12345/roles', {'per_page': 10})
+            mock_iter.assert_called_with(
+                '/api/v1/accounts/12345/roles?per_page=10', False, None)
+
+    def test_page_range(self):
+        canvas = Canvas()
+        response = MockHTTP()
+        response.headers = {"Link": (
+            '</api/v1/courses?page=1&per_page=10>; rel="current",'
+            '</api/v1/courses?page=2&per_page=10>; rel="next",'
+            '</api/v1/courses?page=1&per_page=10>; rel="first",'
+            '</api/v1/courses?page=4&per_page=10>; rel="last"')}
+        self.assertEqual(canvas._page_range(response), [
+            '/api/v1/courses?page=2&per_page=10',
+            '/api/v1/courses?page=3&per_page=10',
+            '/api/v1/courses?page=4&per_page=10'])
+
+        response.headers = {"Link": (
+            '</api/v1/courses?page=bookmark:WzEwXQ&per_page=10>; rel="next",'
+            '</api/v1/courses?page=first&per_page=10>; rel="first"')}
+        self.assertEqual(canvas._page_range(response), [])
+
+    def test_get_paged_resource_parallel(self):
+        url = '/api/v1/accounts/12345/external_tools'
+        tools = Canvas()._get_paged_resource(url)
+        self.assertEqual(len(tools), 12)
+
+        canvas = Canvas(page_workers=4)
+        with mock.patch.object(Canvas, '_page_range',
+                               wraps=canvas._page_range) as mock_range:
+            self.assertEqual(canvas._get_paged_resource(url), tools)
+            self.assertEqual(mock_range.call_count, 1)
+        self.assertEqual(canvas.next_page_url, None)
+
+    def test_prefetch_pages(self):
+        url = '/api/v1/accounts/12345/roles'
+        roles = Canvas()._get_paged_resource(url)
+
+        canvas = Canvas(prefetch_pages=2)
+        self.assertEqual(canvas._get_paged_resource(url), roles)
+        self.assertEqual(list(canvas._iter_paged_resource(url)), roles)
+
+        iter_roles = canvas._iter_paged_resource(url)
+        self.assertEqual(next(iter_roles), roles[0])
+        iter_roles.close()
+
+        iter_roles = canvas._iter_paged_resource('/api/v1/accounts/00000')
+        self.assertRaises(DataFailureException, list, iter_roles)
+
+    @override_settings(RESTCLIENTS_CANVAS_ETAG_CACHE_SIZE=2)
+    @mock.patch.object(Canvas_DAO, 'getURL')
+    def test_etag_cache(self, mock_get):
+        def response(status, data='', etag=None):
+            response = MockHTTP()
+            response.status = status
+            response.data = data
+            response.headers = {'ETag': etag} if etag else {}
+            return response
+
+        canvas = Canvas()
+        mock_get.return_value = response(200, '{"id": 1}', etag='"abc"')
+        self.assertEqual(canvas._get_resource('/api/v1/accounts/1'),
+                         {'id': 1})
+        self.assertNotIn('If-None-Match', mock_get.call_args.args[1])
+
+        mock_get.return_value = response(304)
+        self.assertEqual(canvas._get_resource('/api/v1/accounts/1'),
+                         {'id': 1})
+        self.assertEqual(
+            mock_get.call_args.args[1]['If-None-Match'], '"abc"')
+
+        mock_get.return_value = response(200, '{"id": 2}', etag='"def"')
+        self.assertEqual(Canvas()._get_resource('/api/v1/accounts/1'),
+                         {'id': 2})
+        self.assertEqual(
+            mock_get.call_args.args[1]['If-None-Match'], '"abc"')
+
+        mock_get.return_value = response(304)
+        self.assertRaises(DataFailureException, canvas._get_resource,
+                          '/api/v1/accounts/2')
+
+        canvas = Canvas(as_user='javerage')
+        mock_get.return_value = response(200, '{"id": 3}')
+        self.assertEqual(canvas._get_resource('/api/v1/accounts/1'),
+                         {'id': 3})
+        self.assertNotIn('If-None-Match', mock_get.call_args.args[1])
+
+    @mock.patch.object(Canvas_DAO, 'getURL')
+    def test_etag_cache_disabled(self, mock_get):
+        response = MockHTTP()
+        response.status = 200
+        response.data = '{"id": 1}'
+        response.headers = {'ETag': '"abc"'}
+        mock_get.return_value = response
+
+        canvas = Canvas()
+        canvas._get_resource('/api/v1/accounts/1')
+        canvas._get_resource('/api/v1/accounts/1')
+        self.assertNotIn('If-None-Match', mock_get.call_args.args[1])
+
+    @override_settings(
+        RESTCLIENTS_CANVAS_CACHE_CLASS='uw_canvas.cache.ResponseCache')
+    @mock.patch.object(Canvas_DAO, 'deleteURL')
+    @mock.patch.object(Canvas_DAO, 'putURL')
+    @mock.patch.object(Canvas_DAO, 'getURL')
+    def test_response_cache(self, mock_get, mock_put, mock_delete):
+        response = MockHTTP()
+        response.status = 200
+        response.data = '{"id": 1}'
+        mock_get.return_value = response
+        mock_put.return_value = response
+        mock_delete.return_value = response
+
+        Canvas._response_cache = None
+        canvas = Canvas()
+        canvas._get_resource('/api/v1/accounts/1')
+        canvas._get_resource('/api/v1/accounts/1/roles')
+        canvas._get_resource('/api/v1/accounts/1')
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(canvas._get_response_cache().hits, 1)
+
+        canvas._get_resource('/api/v1/courses/1')
+        canvas._get_resource('/api/v1/courses/1')
+        self.assertEqual(mock_get.call_count, 4)
+
+        canvas._put_resource('/api/v1/accounts/1', body={})
+        canvas._get_resource('/api/v1/accounts/1')
+        canvas._get_resource('/api/v1/accounts/1/roles')
+        self.assertEqual(mock_get.call_count, 6)
+
+        canvas._delete_resource('/api/v1/accounts/1/roles/2')
+        canvas._get_resource('/api/v1/accounts/1')
+        canvas._get_resource('/api/v1/accounts/1/roles')
+        self.assertEqual(mock_get.call_count, 8)
+
+    @mock.patch.object(Canvas_DAO, 'getURL')
+    def test_coalesced_requests(self, mock_get):
+        release = Event()
+
+        def get_url(url, headers):
+            release.wait(5)
+            response = MockHTTP()
+            response.status = 200 if url.endswith('1') else 404
+            response.data = '{"id": 1}'
+            return response
+
+        mock_get.side_effect = get_url
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(Canvas()._get_resource,
+                                   '/api/v1/accounts/1') for i in range(4)]
+            while not mock_get.called:
+                sleep(0.01)
+            sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, [{'id': 1}] * 4)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(Canvas._in_flight, {})
+
+        release.clear()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(Canvas()._get_resource,
+                                   '/api/v1/accounts/2') for i in range(2)]
+            while mock_get.call_count < 2:
+                sleep(0.01)
+            sleep(0.05)
+            release.set()
+            for future in futures:
+                self.assertRaises(DataFailureException, future.result)
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(Canvas._in_flight, {})
+
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt(url, headers):
+            release.wait(5)
+            raise Interrupt()
+
+        mock_get.side_effect = interrupt
+        release.clear()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(Canvas()._get_resource,
+                                   '/api/v1/accounts/3') for i in range(2)]
+            while mock_get.call_count < 3:
+                sleep(0.01)
+            sleep(0.05)
+            release.set()
+            for future in futures:
+                self.assertRaises(Interrupt, future.result, 5)
+
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(Canvas._in_flight, {})
+
     @mock.patch.object(Canvas_DAO, '__init__')
     def test_api_host(self, mock_dao):
         mock_dao.return_value = None
 
         canvas = Canvas(canvas_api_host='canvas.test.edu')
         mock_dao.assert_called_with(canvas_api_host='canvas.test.edu')
+
+
+@fdao_canvas_override
+class CanvasTestAsyncCanvas(TestCase):
+    def test_get_paged_resource(self):
+        url = '/api/v1/accounts/12345/roles'
+        canvas = AsyncCanvas()
+        roles = asyncio.run(canvas._get_paged_resource(url))
+        self.assertEqual(roles, Canvas()._get_paged_resource(url))
+
+    def test_executor(self):
+        canvas = AsyncCanvas(max_concurrency=64, per_page=50)
+        self.assertEqual(canvas._executor._max_workers, 64)
+        self.assertIsInstance(canvas._sync, Canvas)
+        self.assertEqual(canvas._sync._per_page, 50)
+
+    def test_max_concurrency(self):
+        canvas = AsyncCanvas(max_concurrency=2)
+        get_response = canvas._get_response
+        lock = Lock()
+        in_flight = []
+        counts = []
+
+        def slow_get_response(url):
+            with lock:
+                in_flight.append(url)
+                counts.append(len(in_flight))
+            sleep(0.01)
+            with lock:
+                in_flight.remove(url)
+            return get_response(url)
+
+        async def get_roles():
+            return await asyncio.gather(*[canvas._get_resource(
+                '/api/v1/accounts/12345/roles')
+                for i in range(6)])
+
+        with mock.patch.object(canvas, '_get_response', slow_get_response):
+            roles = asyncio.run(get_roles())
+
+        self.assertEqual(len(roles), 6)
+        self.assertEqual(len(counts), 12)
+        self.assertLessEqual(max(counts), 2)
@@ -4,8 +4,10 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.courses import Courses
+from uw_canvas.courses import Courses, AsyncCourses
 from uw_canvas.models import CanvasCourse
+from restclients_core.exceptions import DataFailureException
+import asyncio
 import mock
 
 
@@ -80,6 +82,33 @@ class CanvasTestCourses(TestCase):
             course.course_url, "https://canvas.uw.edu/courses/141414",
             "Has proper course url")
 
+    def test_iter_courses(self):
+        canvas = Courses()
+
+        courses = list(canvas.iter_courses_in_account_by_sis_id(
+            'uwcourse:seattle:arts-&-sciences:amath:amath',
+            {'published': True}))
+
+        self.assertEqual(len(courses), 7, "Too few courses")
+        self.assertEqual(courses[2].course_id, 141414, "Has proper course id")
+
+    def test_get_courses(self):
+        canvas = Courses()
+
+        with mock.patch.object(Courses, 'get_course',
+                               wraps=canvas.get_course) as mock_get:
+            courses = canvas.get_courses([149650, 149650])
+            self.assertEqual(mock_get.call_count, 1)
+
+        self.assertEqual(len(courses), 2)
+        self.assertEqual(courses[0].course_id, 149650, "Has proper course id")
+        self.assertEqual(courses[0].term.term_id, 810)
+        self.assertIs(courses[1], courses[0])
+
+        courses = canvas.get_courses_by_sis_ids(['2013-autumn-PHYS-248-A'])
+        self.assertIsInstance(courses[0], DataFailureException)
+        self.assertEqual(courses[0].status, 404)
+
     def test_published_courses(self):
         canvas = Courses()
 
@@ -331,3 +360,44 @@ class CanvasTestCourses(TestCase):
         mock_get_course.return_value = None
         result = canvas.unpublish_course_by_sis_id('nonexistent-course')
         self.assertIsNone(result)
+
+
+@fdao_canvas_override
+class CanvasTestAsyncCourses(TestCase):
+    def test_course(self):
+        canvas = AsyncCourses()
+
+        course = asyncio.run(canvas.get_course(149650))
+        self.assertEqual(course.course_id, 149650, "Has proper course id")
+        self.assertEqual(course.term.term_id, 810, "Course contains term data")
+
+    def test_courses(self):
+        canvas = AsyncCourses()
+
+        async def get_courses():
+            return await asyncio.gather(
+                canvas.get_courses_in_account_by_sis_id(
+                    'uwcourse:seattle:arts-&-sciences:amath:amath',
+                    {'published': True}),
+                canvas.get_course(149650))
+
+        courses, course = asyncio.run(get_courses())
+        self.assertEqual(len(courses), 7, "Too few courses")
+        self.assertEqual(courses[2].course_id, 141414)
+        self.assertEqual(course.sis_course_id, '2013-spring-PHYS-121-A')
+
+    @mock.patch.object(Courses, '_put_resource')
+    def test_publish_course(self, mock_put):
+        mock_put.return_value = {
+            'id': 149650, 'account_id': 84378, 'course_code': 'PHYS 121',
+            'name': 'MECHANICS', 'workflow_state': 'available',
+            'is_public': False, 'is_public_to_auth_users': False,
+            'public_syllabus': False,
+            'calendar': {'ics': 'https://canvas.uw.edu/feeds/calendars/'
+                                'course_test.ics'}}
+        canvas = AsyncCourses()
+
+        course = asyncio.run(canvas.publish_course(149650))
+        mock_put.assert_called_with(
+            '/api/v1/courses/149650', {'course': {'event': 'offer'}})
+        self.assertEqual(course.course_id, 149650)
@@ -3,7 +3,12 @@
 
 
 from unittest import TestCase, mock
-from uw_canvas.dao import Canvas_DAO, CanvasFileDownload_DAO
+from uw_canvas.dao import (
+    Canvas_DAO, CanvasFileDownload_DAO, CanvasFileDownloadLiveDAO,
+    CanvasThrottle)
+from restclients_core.models import MockHTTP
+from restclients_core.exceptions import DataFailureException
+from prometheus_client import REGISTRY
 from commonconf import override_settings
 
 
@@ -19,6 +24,164 @@ class TestCanvasDynamicHostnameLiveDAO(TestCase):
         self.assertEqual(dao.get_service_setting("HOST"), dynamic_host)
 
 
+class TestCanvasThrottle(TestCase):
+    def _response(self, status=200, data="", **headers):
+        response = MockHTTP()
+        response.status = status
+        response.data = data
+        response.headers = headers
+        return response
+
+    @mock.patch('uw_canvas.dao.time.sleep')
+    def test_concurrency(self, mock_sleep):
+        throttle = CanvasThrottle(max_concurrency=4, threshold=300)
+        self.assertEqual(throttle.concurrency, 4)
+
+        throttle.acquire()
+        self.assertEqual(throttle.in_flight, 1)
+        throttle.release(self._response(**{
+            "X-Rate-Limit-Remaining": "150.5", "X-Request-Cost": "2.25"}))
+        self.assertEqual(throttle.in_flight, 0)
+        self.assertEqual(throttle.remaining, 150.5)
+        self.assertEqual(throttle.request_cost, 2.25)
+        self.assertEqual(throttle.concurrency, 2)
+
+        throttle.acquire()
+        throttle.release(self._response(**{
+            "X-Rate-Limit-Remaining": "600"}))
+        self.assertEqual(throttle.concurrency, 3)
+
+        throttle.acquire()
+        throttle.release(self._response(
+            status=403, data=b"403 Forbidden (Rate Limit Exceeded)"))
+        self.assertEqual(throttle.remaining, 0)
+        self.assertEqual(throttle.concurrency, 1)
+        self.assertEqual(throttle.throttled_count, 1)
+
+        throttle.acquire()
+        throttle.release(self._response(status=403, data="Unauthorized"))
+        self.assertEqual(throttle.concurrency, 1)
+        self.assertEqual(throttle.throttled_count, 1)
+
+        throttle.acquire()
+        throttle.release(self._response())
+        self.assertEqual(throttle.remaining, 0)
+
+    @mock.patch('uw_canvas.dao.time.sleep')
+    def test_delay(self, mock_sleep):
+        throttle = CanvasThrottle(threshold=300, max_delay=2.0)
+        throttle.acquire()
+        throttle.release(self._response(**{"X-Rate-Limit-Remaining": "700"}))
+        mock_sleep.assert_not_called()
+
+        throttle.acquire()
+        throttle.release(self._response(**{"X-Rate-Limit-Remaining": "150"}))
+        self.assertEqual(throttle.delay_count, 0)
+
+        throttle.acquire()
+        mock_sleep.assert_called_with(1.0)
+        self.assertEqual(throttle.delay_count, 1)
+        throttle.release()
+
+    @override_settings(RESTCLIENTS_CANVAS_HOST='https://canvas.test.edu',
+                       RESTCLIENTS_CANVAS_THROTTLE_CONCURRENCY='5')
+    def test_get_throttle(self):
+        throttle = Canvas_DAO().get_throttle()
+        self.assertIs(Canvas_DAO().get_throttle(), throttle)
+        self.assertEqual(throttle.max_concurrency, 5)
+
+        dao = Canvas_DAO(canvas_api_host='https://dynamic.canvas.edu')
+        self.assertIsNot(dao.get_throttle(), throttle)
+
+
+@mock.patch('uw_canvas.dao.time.sleep')
+@mock.patch.object(Canvas_DAO, '_load_throttled_resource')
+class TestCanvasRetry(TestCase):
+    def _response(self, status=200, data="", **headers):
+        response = MockHTTP()
+        response.status = status
+        response.data = data
+        response.headers = headers
+        return response
+
+    def _retry_count(self, status):
+        return REGISTRY.get_sample_value(
+            'restclient_canvas_request_retry_total',
+            {'service': 'canvas', 'status': str(status)}) or 0
+
+    def test_retry_get(self, mock_load, mock_sleep):
+        retries = self._retry_count(503)
+        mock_load.side_effect = [
+            self._response(status=503),
+            self._response(status=403, data="403 Rate Limit Exceeded",
+                           **{"Retry-After": "7"}),
+            self._response(status=200, data="{}")]
+
+        response = Canvas_DAO().getURL('/api/v1/courses/1', {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(mock_load.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        mock_sleep.assert_called_with(7.0)
+        self.assertEqual(self._retry_count(503), retries + 1)
+
+    @override_settings(RESTCLIENTS_CANVAS_RETRY_MAX_BACKOFF='20')
+    def test_retry_after_limit(self, mock_load, mock_sleep):
+        mock_load.side_effect = [
+            self._response(status=503, **{"Retry-After": "86400"}),
+            self._response(status=200, data="{}")]
+
+        response = Canvas_DAO().getURL('/api/v1/courses/1', {})
+        self.assertEqual(response.status, 200)
+        mock_sleep.assert_called_once_with(20.0)
+
+    @override_settings(RESTCLIENTS_CANVAS_RETRY_MAX='2',
+                       RESTCLIENTS_CANVAS_RETRY_BACKOFF='1',
+                       RESTCLIENTS_CANVAS_RETRY_MAX_BACKOFF='1.5')
+    def test_retry_limit(self, mock_load, mock_sleep):
+        mock_load.return_value = self._response(status=502)
+
+        response = Canvas_DAO().getURL('/api/v1/courses/1', {})
+        self.assertEqual(response.status, 502)
+        self.assertEqual(mock_load.call_count, 3)
+        for call in mock_sleep.call_args_list:
+            self.assertLessEqual(call.args[0], 1.5)
+
+        mock_load.reset_mock()
+        mock_load.return_value = self._response(status=404)
+        response = Canvas_DAO().getURL('/api/v1/courses/1', {})
+        self.assertEqual(response.status, 404)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_retry_connection_error(self, mock_load, mock_sleep):
+        mock_load.side_effect = [
+            DataFailureException('/api/v1/courses/1', 0, 'timeout'),
+            self._response(status=200, data="{}")]
+        response = Canvas_DAO().getURL('/api/v1/courses/1', {})
+        self.assertEqual(response.status, 200)
+
+        mock_load.side_effect = DataFailureException(
+            '/api/v1/courses/1', 0, 'timeout')
+        self.assertRaises(
+            DataFailureException, Canvas_DAO().getURL, '/api/v1/courses/1')
+
+    def test_retry_put(self, mock_load, mock_sleep):
+        mock_load.side_effect = [
+            self._response(status=503), self._response(status=200)]
+        response = Canvas_DAO().putURL('/api/v1/courses/1', {}, '{}')
+        self.assertEqual(response.status, 503)
+        self.assertEqual(mock_load.call_count, 1)
+
+        mock_load.side_effect = [
+            self._response(status=503), self._response(status=200)]
+        response = Canvas_DAO().putURL(
+            '/api/v1/courses/1', {}, '{}', retry=True)
+        self.assertEqual(response.status, 200)
+
+        mock_load.side_effect = [self._response(status=503)]
+        response = Canvas_DAO().postURL('/api/v1/courses/1', {}, '{}')
+        self.assertEqual(response.status, 503)
+
+
 class TestCanvasCustomHeaders(TestCase):
     def test_default_headers(self):
         dao = Canvas_DAO()
@@ -63,6 +226,58 @@ class TestCanvasFileDownloadLiveDAO(TestCase):
         dao._get_retry()
         mock_retry.assert_called_with(total=2, connect=1, read=1, redirect=2)
 
+    def test_get_pool(self):
+        CanvasFileDownloadLiveDAO.pools = {}
+        dao = CanvasFileDownload_DAO()._get_live_implementation()
+        pool = dao.get_pool()
+        self.assertIs(dao.get_pool(), pool)
+        self.assertIs(
+            CanvasFileDownload_DAO()._get_live_implementation().get_pool(),
+            pool)
+        self.assertEqual(CanvasFileDownloadLiveDAO.get_pool_stats(),
+                         {'https://canvas.test.edu': {}})
+
+        pool.connection_from_url('https://files.test.edu/1')
+        self.assertEqual(CanvasFileDownloadLiveDAO.get_pool_stats(), {
+            'https://canvas.test.edu': {'files.test.edu': {
+                'connections': 0, 'requests': 0}}})
+
+    @mock.patch('uw_canvas.dao.PoolManager')
+    def test_create_pool(self, mock_pool):
+        dao = CanvasFileDownload_DAO()._get_live_implementation()
+        dao.create_pool()
+        self.assertEqual(mock_pool.call_args.kwargs['maxsize'], 10)
+        self.assertEqual(mock_pool.call_args.kwargs['num_pools'], 10)
+        self.assertTrue(dao._get_keep_alive())
+
+    @mock.patch.object(CanvasFileDownloadLiveDAO, 'get_pool')
+    def test_load(self, mock_pool):
+        dao = CanvasFileDownload_DAO()._get_live_implementation()
+        dao.load('GET', 'https://canvas.edu/files/1', {'Accept': '*'}, None)
+        mock_pool.return_value.urlopen.assert_called_with(
+            'GET', 'https://canvas.test.edu/files/1', headers={
+                'Accept': '*', 'Connection': 'keep-alive'},
+            preload_content=True)
+
+        with mock.patch.object(dao, '_get_keep_alive', return_value=False):
+            dao.load('GET', 'https://canvas.edu/files/1', {}, None)
+        mock_pool.return_value.urlopen.assert_called_with(
+            'GET', 'https://canvas.test.edu/files/1', headers={
+                'Connection': 'close'}, preload_content=True)
+
+
+class TestCanvasFileDownloadStream(TestCase):
+    @override_settings(RESTCLIENTS_CANVAS_DAO_CLASS='Live',
+                       RESTCLIENTS_CANVAS_HOST='https://canvas.test.edu',
+                       RESTCLIENTS_CANVAS_OAUTH_BEARER='TEST123')
+    @mock.patch.object(CanvasFileDownloadLiveDAO, 'load')
+    def test_stream_url(self, mock_load):
+        CanvasFileDownload_DAO().streamURL('/files/1', {'Accept': '*'})
+        mock_load.assert_called_with(
+            'GET', '/files/1', {'Accept': '*', 'Authorization':
+                                'Bearer TEST123'},
+            None, preload_content=False)
+
 
 class TestCanvasFileDownloadCustomHeaders(TestCase):
     @override_settings(RESTCLIENTS_CANVAS_OAUTH_BEARER='TEST123')
@@ -4,8 +4,9 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.enrollments import Enrollments
+from uw_canvas.enrollments import Enrollments, AsyncEnrollments
 from uw_canvas.models import CanvasEnrollment
+import asyncio
 import mock
 
 
@@ -53,6 +54,19 @@ class CanvasTestEnrollment(TestCase):
         self.assertEqual(enr.sis_section_id, "2013-autumn-PHYS-248-A--")
         self.assertEqual(enr.sws_section_id(), "2013,autumn,PHYS,248/A")
 
+    def test_iter_enrollments_for_course_id(self):
+        canvas = Enrollments()
+
+        enrollments = canvas.iter_enrollments_for_course_by_sis_id(
+            "2013-autumn-PHYS-248-A")
+        self.assertEqual(len(list(enrollments)), 2, "Has 2 canvas enrollments")
+
+        students = list(canvas.iter_enrollments_for_section_by_sis_id(
+            "2013-autumn-PHYS-248-A--", {"role": "student"}))
+        self.assertEqual(len(students), 1, "Has 1 student enrollments")
+        self.assertEqual(
+            students[0].sis_section_id, "2013-autumn-PHYS-248-A--")
+
     # Expected values will have to change when the json files are updated
     def test_enrollments_by_regid(self):
         canvas = Enrollments()
@@ -147,3 +161,21 @@ class CanvasTestEnrollment(TestCase):
                          'Librarian')
         self.assertEqual(CanvasEnrollment.sis_import_role('Unknown Role'),
                          None)
+
+
+@fdao_canvas_override
+class CanvasTestAsyncEnrollment(TestCase):
+    def test_enrollments_for_course_id(self):
+        canvas = AsyncEnrollments()
+
+        async def get_enrollments():
+            return await asyncio.gather(
+                canvas.get_enrollments_for_course_by_sis_id(
+                    "2013-autumn-PHYS-248-A"),
+                canvas.get_enrollments_for_section_by_sis_id(
+                    "2013-autumn-PHYS-248-A--", {"role": "student"}))
+
+        enrollments, students = asyncio.run(get_enrollments())
+        self.assertEqual(len(enrollments), 2, "Has 2 canvas enrollments")
+        self.assertEqual(len(students), 1, "Has 1 student enrollments")
+        self.assertEqual(students[0].current_score, 77.76)
@@ -0,0 +1,62 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from unittest import TestCase
+from uw_canvas.report_store import ReportStore
+from tempfile import TemporaryDirectory
+import os
+
+SECTIONS_CSV = (
+    '\ufeffcanvas_section_id,section_id,canvas_course_id,course_id,name\r\n'
+    '1,2013-spring-TRAIN-100-AA,101,2013-spring-TRAIN-100-A,"AA"\r\n'
+    '2,2013-spring-TRAIN-100-AB,101,2013-spring-TRAIN-100-A,"A\r\nB"\r\n'
+    '3,,102,2013-spring-TRAIN-101-A,"Café ""3"""\r\n'
+    '4,2013-spring-TRAIN-102-A,103,2013-spring-TRAIN-102-A,last')
+
+
+class CanvasTestReportStore(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sections.csv")
+        with open(self.path, "wb") as f:
+            f.write(SECTIONS_CSV.encode("utf-8"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get(self):
+        with ReportStore(self.path) as store:
+            self.assertEqual(store.columns[0], 'canvas_section_id')
+            self.assertEqual(store.keys(), [
+                'canvas_course_id', 'course_id', 'canvas_section_id',
+                'section_id'])
+
+            row = store.get('section_id', '2013-spring-TRAIN-100-AB')
+            self.assertEqual(row['canvas_section_id'], '2')
+            self.assertEqual(row['name'], 'A\r\nB')
+
+            self.assertEqual(store.get('canvas_section_id', 3)['name'],
+                             'Café "3"')
+            self.assertEqual(store.get('canvas_section_id', 4)['name'],
+                             'last')
+            self.assertIsNone(store.get('section_id', 'none'))
+            self.assertIsNone(store.get('section_id', ''))
+
+            rows = store.get_all('canvas_course_id', 101)
+            self.assertEqual([r['section_id'] for r in rows], [
+                '2013-spring-TRAIN-100-AA', '2013-spring-TRAIN-100-AB'])
+            self.assertEqual(store.get_all('course_id', 'none'), [])
+            self.assertRaises(KeyError, store.get, 'name', 'AA')
+
+    def test_remove(self):
+        store = ReportStore(self.path, keys=['section_id'], remove=True)
+        self.assertEqual(store.keys(), ['section_id'])
+        store.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_empty(self):
+        open(self.path, "wb").close()
+        with ReportStore(self.path) as store:
+            self.assertEqual(store.columns, [])
+            self.assertEqual(store.keys(), [])
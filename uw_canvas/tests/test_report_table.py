@@ -0,0 +1,141 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from unittest import TestCase
+from uw_canvas.report_table import (
+    ReportTable, CategoryColumn, split_report_file, count_report_file)
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+import mock
+import csv
+import io
+import os
+
+ENROLLMENTS_CSV = [
+    "canvas_course_id,course_id,canvas_user_id,user_id,role,role_id,"
+    "status,created_by_sis,start_date",
+    "101,2013-spring-TRAIN-100-A,1,javerage,student,3,active,true,"
+    "2013-04-01T07:00:00Z",
+    "101,2013-spring-TRAIN-100-A,2,jstaff,teacher,4,active,true,",
+    "102,2013-spring-TRAIN-101-A,1,javerage,student,3,deleted,false,"
+    "2013-04-01T07:00:00Z",
+    "102,,,ghost,student,3,active",
+    "",
+]
+
+
+class CanvasTestReportTable(TestCase):
+    def setUp(self):
+        self.table = ReportTable.from_rows(csv.reader(ENROLLMENTS_CSV))
+
+    def test_from_rows(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.columns[:3], [
+            'canvas_course_id', 'course_id', 'canvas_user_id'])
+        self.assertEqual(self.table.row(0), {
+            'canvas_course_id': 101,
+            'course_id': '2013-spring-TRAIN-100-A',
+            'canvas_user_id': 1,
+            'user_id': 'javerage',
+            'role': 'student',
+            'role_id': 3,
+            'status': 'active',
+            'created_by_sis': 'true',
+            'start_date': datetime(2013, 4, 1, 7, tzinfo=timezone.utc)})
+        self.assertIsNone(self.table.row(1)['start_date'])
+        self.assertIsNone(self.table.row(3)['canvas_user_id'])
+        self.assertEqual(self.table.row(3)['created_by_sis'], '')
+        self.assertEqual(self.table.column('canvas_user_id'),
+                         [1, 2, 1, None])
+        self.assertIsInstance(self.table._data['role'], CategoryColumn)
+        self.assertEqual(self.table._data['role'].categories,
+                         ['student', 'teacher'])
+
+        self.assertEqual(len(ReportTable.from_rows([])), 0)
+
+    def test_filter(self):
+        table = self.table.filter(role='student', status='active')
+        self.assertEqual(table.column('user_id'), ['javerage', 'ghost'])
+
+        table = self.table.filter(canvas_course_id=102,
+                                  canvas_user_id=lambda v: v is not None)
+        self.assertEqual(table.column('status'), ['deleted'])
+        self.assertEqual(len(self.table.filter(start_date=None)), 2)
+        self.assertEqual(len(self.table.filter(role='observer')), 0)
+
+    def test_group_by(self):
+        groups = self.table.group_by('canvas_course_id')
+        self.assertEqual(sorted(groups.keys()), [101, 102])
+        self.assertEqual(groups[101].column('role'), ['student', 'teacher'])
+        self.assertEqual([row['user_id'] for row in groups[102]],
+                         ['javerage', 'ghost'])
+
+        self.assertEqual(self.table.counts('role'),
+                         {'student': 3, 'teacher': 1})
+        self.assertEqual(len(self.table.group_by('start_date')[None]), 2)
+
+
+def is_student(role):
+    return role == 'student'
+
+
+class CanvasTestReportFile(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "report.csv")
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(['canvas_user_id', 'role', 'name'])
+            for i in range(1, 101):
+                writer.writerow([i, 'student' if i % 4 else 'teacher',
+                                 'line\n"{}"'.format(i) if i % 7 else i])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_split_report_file(self):
+        header, ranges = split_report_file(self.path, 8)
+        self.assertEqual(header, ['canvas_user_id', 'role', 'name'])
+        self.assertEqual(len(ranges), 8)
+
+        rows = []
+        with open(self.path, "rb") as f:
+            for start, end in ranges:
+                f.seek(start)
+                text = f.read(end - start).decode("utf-8")
+                rows.extend(csv.reader(io.StringIO(text, newline="")))
+        self.assertEqual([int(row[0]) for row in rows], list(range(1, 101)))
+        self.assertEqual(rows[0][2], 'line\n"1"')
+
+        header, ranges = split_report_file(self.path, 1000)
+        self.assertEqual(len(ranges), 100)
+
+    def test_from_file(self):
+        table = ReportTable.from_file(self.path, processes=1)
+        self.assertEqual(table.column('canvas_user_id'),
+                         list(range(1, 101)))
+
+        table = ReportTable.from_file(self.path, processes=3,
+                                      role=is_student)
+        self.assertEqual(len(table), 75)
+        self.assertEqual(table.counts('role'), {'student': 75})
+        self.assertEqual(table.row(6)['name'], 'line\n"9"')
+        self.assertEqual(table.row(5)['name'], '7')
+
+    @mock.patch('uw_canvas.report_table.RANGE_SIZE', 200)
+    def test_from_file_ranges(self):
+        with mock.patch('uw_canvas.report_table.split_report_file',
+                        wraps=split_report_file) as mock_split:
+            table = ReportTable.from_file(self.path, processes=2)
+        self.assertGreater(mock_split.call_args[0][1], 2)
+        self.assertEqual(table.column('canvas_user_id'),
+                         list(range(1, 101)))
+        self.assertEqual(table.row(0)['name'], 'line\n"1"')
+
+    def test_count_report_file(self):
+        self.assertEqual(count_report_file(self.path, 'role', processes=3),
+                         {'student': 75, 'teacher': 25})
+        self.assertEqual(count_report_file(self.path, 'role', processes=2,
+                                           role='teacher'),
+                         {'teacher': 25})
@@ -4,9 +4,18 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.reports import Reports, ReportFailureException
+from uw_canvas.reports import (
+    Reports, AsyncReports, ReportPoller, ReportFailureException,
+    ReportTimeoutException)
 from uw_canvas.models import Report, ReportType
+from restclients_core.exceptions import DataFailureException
+from tempfile import TemporaryDirectory
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+import asyncio
 import mock
+import gc
+import os
 
 
 @fdao_canvas_override
@@ -65,6 +74,16 @@ class CanvasTestReports(TestCase):
         self.assertEqual(report.type, self.report_json_data["report"])
         self.assertEqual(report.account_id, '12345')
 
+    @mock.patch.object(Reports, '_iter_paged_resource')
+    def test_iter_reports_by_type(self, mock_iter):
+        mock_iter.return_value = iter([self.report_json_data])
+        canvas = Reports()
+        ret = list(canvas.iter_reports_by_type('12345', 'sis_import'))
+        mock_iter.assert_called_with(
+            '/api/v1/accounts/12345/reports/sis_import')
+        self.assertEqual(ret[0].type, self.report_json_data["report"])
+        self.assertEqual(ret[0].account_id, '12345')
+
     @mock.patch.object(Reports, '_post_resource')
     def test_create_report(self, mock_post):
         canvas = Reports()
@@ -155,6 +174,388 @@ class CanvasTestReports(TestCase):
         self.assertEqual(canvas.get_report_data(report),
                          ['a', 'b', 'c', 'd', 'e'])
 
+    def stream_response(self, data, chunk_size=5):
+        response = mock.MagicMock()
+        response.status = 200
+        response.stream.return_value = [
+            data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        return response
+
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    def test_iter_report_rows(self, mock_dao):
+        data = ('id,name\r\n1,"Caf\u00e9"\r\n2,"two\nlines"\r\n'
+                '3,last').encode("utf-8")
+        mock_dao.return_value.streamURL.return_value = self.stream_response(
+            data)
+        canvas = Reports()
+
+        report = Report(data=self.report_json_data)
+        self.assertEqual(list(canvas.iter_report_rows(report)), [
+            ['id', 'name'], ['1', 'Caf\u00e9'], ['2', 'two\nlines'],
+            ['3', 'last']])
+        mock_dao.return_value.streamURL.assert_called_with(
+            'https://test.canvas.edu/...')
+        self.assertTrue(
+            mock_dao.return_value.streamURL.return_value.release_conn.called)
+
+        rows = list(canvas.iter_report_rows(report, as_dict=True))
+        self.assertEqual(rows[1], {'id': '2', 'name': 'two\nlines'})
+
+        response = self.stream_response(data)
+        mock_dao.return_value.streamURL.return_value = response
+        rows = canvas.iter_report_rows(report)
+        self.assertEqual(next(rows), ['id', 'name'])
+        del rows
+        gc.collect()
+        self.assertTrue(response.close.called)
+        self.assertFalse(response.release_conn.called)
+
+        response = self.stream_response(b'')
+        response.status = 404
+        mock_dao.return_value.streamURL.return_value = response
+        self.assertRaises(DataFailureException, list,
+                          canvas.iter_report_rows(report))
+
+        report = Report(report_id=1)
+        self.assertRaises(
+            ReportFailureException, canvas.iter_report_rows, report)
+
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    def test_get_report_table(self, mock_dao):
+        mock_dao.return_value.streamURL.return_value = self.stream_response(
+            b'canvas_user_id,user_id,status\n1,javerage,active\n')
+        canvas = Reports()
+
+        table = canvas.get_report_table(Report(data=self.report_json_data))
+        self.assertEqual(list(table), [{
+            'canvas_user_id': 1, 'user_id': 'javerage', 'status': 'active'}])
+
+        mock_dao.return_value.streamURL.return_value = self.stream_response(
+            b'canvas_user_id,user_id\n1,javerage\n2,jstaff\n')
+        table = canvas.get_report_table(Report(data=self.report_json_data),
+                                        processes=2)
+        self.assertEqual(table.column('user_id'), ['javerage', 'jstaff'])
+
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    def test_get_report_store(self, mock_dao):
+        mock_dao.return_value.streamURL.side_effect = (
+            lambda url: self.stream_response(
+                b'canvas_user_id,user_id\n1,javerage\n2,jstaff\n'))
+        canvas = Reports()
+        report = Report(data=self.report_json_data)
+
+        with canvas.get_report_store(report) as store:
+            self.assertEqual(store.get('user_id', 'jstaff'), {
+                'canvas_user_id': '2', 'user_id': 'jstaff'})
+        self.assertFalse(os.path.exists(store.path))
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "users.csv")
+            with canvas.get_report_store(report, path=path) as store:
+                self.assertEqual(store.get('canvas_user_id', 1)['user_id'],
+                                 'javerage')
+            self.assertTrue(os.path.exists(path))
+
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    def test_download_report(self, mock_dao):
+        data = b'a,b\n1,2\n'
+        mock_dao.return_value.streamURL.return_value = self.stream_response(
+            data, chunk_size=3)
+        canvas = Reports()
+
+        report = Report(data=self.report_json_data)
+        f = BytesIO()
+        self.assertEqual(canvas.download_report(report, f), len(data))
+        self.assertEqual(f.getvalue(), data)
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "report.csv")
+            self.assertEqual(
+                asyncio.run(AsyncReports().download_report(report, path)),
+                len(data))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def running_report(self, report_id, status="running", progress="0"):
+        return Report(data=dict(self.report_json_data, id=report_id,
+                                status=status, progress=progress))
+
+    @mock.patch('uw_canvas.poller.time.time')
+    def test_report_poller(self, mock_time):
+        mock_time.return_value = 1000
+        poller = ReportPoller([self.running_report(1),
+                               self.running_report(2),
+                               self.running_report(3, status="complete")])
+        poller.min_interval, poller.max_interval = 5, 60
+        self.assertFalse(poller.is_done())
+        self.assertEqual(poller.due(), [])
+
+        mock_time.return_value = 1005
+        self.assertEqual(poller.due(), [0, 1])
+
+        # 10% in 5 seconds, 45 seconds to go
+        poller.update(0, self.running_report(1, progress="10"))
+        # no progress, back off from the minimum interval
+        poller.update(1, self.running_report(2))
+        self.assertEqual(poller.next_delay(), 5)
+
+        mock_time.return_value = 1010
+        self.assertEqual(poller.due(), [1])
+        poller.update(1, self.running_report(2))
+        self.assertEqual(poller.next_delay(), 10)
+
+        mock_time.return_value = 1020
+        self.assertEqual(poller.due(), [1])
+        # 50% in 10 seconds, 10 seconds to go
+        poller.update(1, self.running_report(2, progress="50"))
+        self.assertEqual(poller.next_delay(), 10)
+
+        mock_time.return_value = 1050
+        self.assertEqual(poller.due(), [0, 1])
+        poller.update(0, self.running_report(1, status="complete"))
+        poller.update(1, self.running_report(2, status="complete"))
+        self.assertTrue(poller.is_done())
+
+        self.assertRaises(ReportFailureException, poller.update, 0,
+                          self.running_report(1, status="error"))
+
+    @mock.patch('uw_canvas.reports.sleep')
+    @mock.patch.object(Reports, 'get_report_status')
+    def test_wait_for_reports(self, mock_status, mock_sleep):
+        statuses = {
+            1: [self.running_report(1, progress="50"),
+                self.running_report(1, status="complete")],
+            2: [self.running_report(2, status="complete")]}
+        mock_status.side_effect = lambda r: statuses[r.report_id].pop(0)
+        callback = mock.MagicMock()
+        canvas = Reports()
+
+        reports = canvas.wait_for_reports(
+            [self.running_report(1), self.running_report(2)],
+            callback=callback)
+        self.assertEqual([r.status for r in reports],
+                         ["complete", "complete"])
+        self.assertEqual(mock_status.call_count, 3)
+        self.assertEqual(callback.call_count, 3)
+
+    @mock.patch('uw_canvas.poller.time.time')
+    @mock.patch('uw_canvas.reports.sleep')
+    @mock.patch.object(Reports, 'get_report_status')
+    def test_wait_for_reports_timeout(self, mock_status, mock_sleep,
+                                      mock_time):
+        clock = [1000]
+        mock_time.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda s: clock.__setitem__(0, clock[0] + s)
+        mock_status.side_effect = lambda r: self.running_report(1)
+        canvas = Reports()
+
+        self.assertRaises(ReportTimeoutException, canvas.wait_for_reports,
+                          [self.running_report(1)], timeout=0.01)
+        self.assertEqual(clock[0], 1000.01)
+
+    @mock.patch('uw_canvas.reports.sleep')
+    @mock.patch.object(Reports, 'delete_report')
+    @mock.patch.object(Reports, '_get_report_file')
+    @mock.patch.object(Reports, 'get_report_status')
+    @mock.patch.object(Reports, 'create_report')
+    def test_run_reports(self, mock_create, mock_status, mock_get,
+                         mock_delete, mock_sleep):
+        created = []
+
+        def create_report(report_type, account_id, term_id=None):
+            created.append(term_id)
+            running = [r for r in created if r is not None]
+            self.assertLessEqual(len(running), 2)
+            return self.running_report(term_id)
+
+        def report_status(report):
+            created[created.index(report.report_id)] = None
+            status = "error" if report.report_id == 2 else "complete"
+            return self.running_report(report.report_id, status=status)
+
+        mock_create.side_effect = create_report
+        mock_status.side_effect = report_status
+        mock_get.return_value = "a\nb"
+        canvas = Reports()
+
+        specs = [{"report_type": "sis_export_csv", "account_id": "12345",
+                  "term_id": term_id} for term_id in [1, 2, 3]]
+        results = canvas.run_reports(specs, max_running=2)
+
+        self.assertEqual(results[0][0].report_id, 1)
+        self.assertEqual(results[0][1], ["a", "b"])
+        self.assertIsInstance(results[1], ReportFailureException)
+        self.assertEqual(results[2][0].report_id, 3)
+        self.assertEqual(mock_create.call_count, 3)
+        self.assertEqual(mock_delete.call_count, 3)
+
+        def missing_status(report):
+            if report.report_id == 1:
+                raise DataFailureException("/", 404, "")
+            return self.running_report(report.report_id, status="complete")
+
+        mock_delete.reset_mock()
+        mock_create.side_effect = create_report
+        mock_status.side_effect = missing_status
+        results = canvas.run_reports(specs[:2])
+        self.assertIsInstance(results[0], DataFailureException)
+        self.assertEqual(results[1][0].report_id, 2)
+        self.assertEqual(results[1][1], ["a", "b"])
+        self.assertEqual(mock_delete.call_count, 2)
+
+    @mock.patch.object(Reports, 'delete_report')
+    @mock.patch.object(Reports, '_get_report_file')
+    @mock.patch.object(Reports, 'create_report')
+    def test_run_reports_create_failure(self, mock_create, mock_get,
+                                        mock_delete):
+        mock_create.side_effect = [
+            DataFailureException("/", 500, ""),
+            self.running_report(2, status="error"),
+            self.running_report(3, status="complete")]
+        mock_get.return_value = "a"
+        canvas = Reports()
+
+        specs = [{"report_type": "sis_export_csv", "account_id": "12345",
+                  "term_id": term_id} for term_id in [1, 2, 3]]
+        results = canvas.run_reports(specs)
+
+        self.assertIsInstance(results[0], DataFailureException)
+        self.assertIsInstance(results[1], ReportFailureException)
+        self.assertEqual(results[1].report.report_id, 2)
+        self.assertEqual(results[2][0].report_id, 3)
+        self.assertEqual(results[2][1], ["a"])
+        self.assertEqual(mock_delete.call_count, 2)
+
+    @mock.patch.object(Reports, 'delete_report')
+    @mock.patch.object(Reports, '_get_report_file')
+    @mock.patch.object(Reports, 'get_recent_report')
+    @mock.patch.object(Reports, 'create_report')
+    def test_run_reports_reused(self, mock_create, mock_recent, mock_get,
+                                mock_delete):
+        mock_recent.side_effect = [
+            self.running_report(1, status="complete"), None]
+        mock_create.return_value = self.running_report(2, status="complete")
+        mock_get.return_value = "a"
+        canvas = Reports()
+
+        specs = [{"report_type": "sis_export_csv", "account_id": "12345",
+                  "term_id": term_id, "max_age": 600} for term_id in [1, 2]]
+        results = canvas.run_reports(specs)
+
+        self.assertEqual([r[0].report_id for r in results], [1, 2])
+        mock_recent.assert_called_with(
+            "sis_export_csv", "12345", 2, {}, max_age=600)
+        mock_create.assert_called_once_with(
+            report_type="sis_export_csv", account_id="12345", term_id=2)
+        mock_delete.assert_called_once_with(results[1][0])
+
+    @mock.patch.object(Reports, 'delete_report')
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    @mock.patch.object(Reports, 'create_report')
+    def test_run_reports_directory(self, mock_create, mock_dao,
+                                   mock_delete):
+        mock_create.return_value = self.running_report(1, status="complete")
+        mock_dao.return_value.streamURL.return_value = self.stream_response(
+            b'a,b\n')
+        canvas = Reports()
+
+        with TemporaryDirectory() as tmpdir:
+            results = canvas.run_reports([{
+                "report_type": "sis_export_csv", "account_id": "12345"}],
+                directory=tmpdir, delete=False)
+            path = os.path.join(tmpdir, "1_test.csv")
+            self.assertEqual(results[0][1], path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b'a,b\n')
+        self.assertFalse(mock_delete.called)
+
+    @mock.patch.object(AsyncReports, 'get_report_status')
+    def test_async_wait_for_reports(self, mock_status):
+        mock_status.side_effect = lambda r: self.running_report(
+            r.report_id, status="complete")
+        canvas = AsyncReports()
+
+        reports = asyncio.run(canvas.wait_for_reports(
+            [self.running_report(1), self.running_report(2)]))
+        self.assertEqual([r.report_id for r in reports], [1, 2])
+        self.assertEqual(mock_status.call_count, 2)
+
+    def recent_report(self, report_id, minutes_ago, **kwargs):
+        ended_at = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+        created_at = ended_at - timedelta(minutes=1)
+        return Report(data=dict(
+            self.report_json_data, id=report_id,
+            created_at=created_at.isoformat(), ended_at=ended_at.isoformat(),
+            **kwargs))
+
+    @mock.patch.object(Reports, '_post_resource')
+    @mock.patch.object(Reports, 'iter_reports_by_type')
+    def test_get_recent_report(self, mock_reports, mock_post):
+        params = {"enrollment_term_id": "1", "courses": "true",
+                  "users": "false"}
+        reports = [
+            self.recent_report(2, 5, parameters=params, status="running"),
+            self.recent_report(3, 5, parameters=dict(params, users=True)),
+            self.recent_report(1, 10, parameters=params),
+            self.recent_report(5, 20, parameters=params),
+            self.recent_report(4, 90, parameters=params),
+            self.recent_report(6, 120, parameters=params)]
+        fetched = []
+
+        def iter_reports(account_id, report_type):
+            for report in reports:
+                fetched.append(report.report_id)
+                yield report
+
+        mock_reports.side_effect = iter_reports
+        canvas = Reports()
+
+        report = canvas.get_recent_report(
+            "provisioning_csv", "12345", term_id=1,
+            params={"courses": True}, max_age=3600)
+        self.assertEqual(report.report_id, 1)
+        mock_reports.assert_called_with("12345", "provisioning_csv")
+        self.assertEqual(fetched, [2, 3, 1, 5, 4])
+
+        self.assertIsNone(canvas.get_recent_report(
+            "provisioning_csv", "12345", term_id=2,
+            params={"courses": True}))
+        self.assertIsNone(canvas.get_recent_report(
+            "provisioning_csv", "12345", term_id=1,
+            params={"courses": True}, max_age=60))
+
+        report = canvas.create_course_provisioning_report(
+            "12345", term_id=1, max_age=3600)
+        self.assertEqual(report.report_id, 1)
+        self.assertFalse(mock_post.called)
+
+        canvas.create_course_provisioning_report(
+            "12345", term_id=1, params={}, max_age=300)
+        self.assertTrue(mock_post.called)
+
+    @mock.patch('uw_canvas.reports.CanvasFileDownload_DAO')
+    def test_report_cache(self, mock_dao):
+        data = b'a,b\n1,2\n'
+        mock_dao.return_value.streamURL.side_effect = (
+            lambda url: self.stream_response(data))
+        canvas = Reports()
+        report = Report(data=self.report_json_data)
+
+        with TemporaryDirectory() as tmpdir:
+            with mock.patch('uw_canvas.reports.settings') as mock_settings:
+                mock_settings.CANVAS_REPORT_CACHE_DIR = tmpdir
+                mock_settings.CANVAS_REPORT_POLLING_INTERVAL = 0.001
+                self.assertEqual(canvas.get_report_data(report),
+                                 ['a,b', '1,2', ''])
+                self.assertEqual(list(canvas.iter_report_rows(report)),
+                                 [['a', 'b'], ['1', '2']])
+                f = BytesIO()
+                canvas.download_report(report, f)
+                self.assertEqual(f.getvalue(), data)
+
+            self.assertEqual(os.listdir(tmpdir), ['12345_1_test.csv'])
+        self.assertEqual(mock_dao.return_value.streamURL.call_count, 1)
+
     @mock.patch.object(Reports, '_delete_resource')
     def test_delete_report(self, mock_delete):
         canvas = Reports()
@@ -163,3 +564,50 @@ class CanvasTestReports(TestCase):
         canvas.delete_report(report)
         mock_delete.assert_called_with(
             '/api/v1/accounts/12345/reports/some_type/1')
+
+    @mock.patch.object(Reports, '_get_report_file')
+    @mock.patch.object(AsyncReports, 'get_report_status')
+    def test_async_get_report_data(self, mock_status, mock_get):
+        mock_get.return_value = "a\nb\nc"
+        mock_status.return_value = Report(data=dict(
+            self.report_json_data, status="error"))
+        canvas = AsyncReports()
+
+        report = Report(report_id=1)
+        self.assertRaises(ReportFailureException, asyncio.run,
+                          canvas.get_report_data(report))
+
+        self.report_json_data["status"] = "running"
+        mock_status.return_value = Report(data=dict(
+            self.report_json_data, status="error"))
+        report = Report(data=self.report_json_data)
+        self.assertRaises(ReportFailureException, asyncio.run,
+                          canvas.get_report_data(report))
+
+        mock_status.reset_mock()
+        mock_status.return_value = Report(data=dict(
+            self.report_json_data, status="complete"))
+        report = Report(data=self.report_json_data)
+        self.assertEqual(asyncio.run(canvas.get_report_data(report)),
+                         ['a', 'b', 'c'])
+        self.assertEqual(mock_status.call_count, 1)
+
+    @mock.patch.object(Reports, 'get_recent_report')
+    def test_async_create_report_max_age(self, mock_recent):
+        mock_recent.return_value = Report(data=self.report_json_data)
+        canvas = AsyncReports()
+
+        report = asyncio.run(canvas.create_report(
+            'some_type', 12345, max_age=600))
+        self.assertEqual(report.report_id, '1')
+        mock_recent.assert_called_with(
+            'some_type', 12345, None, {}, max_age=600)
+
+    @mock.patch.object(Reports, '_delete_resource')
+    def test_async_delete_report(self, mock_delete):
+        canvas = AsyncReports()
+
+        report = Report(data=self.report_json_data)
+        self.assertTrue(asyncio.run(canvas.delete_report(report)))
+        mock_delete.assert_called_with(
+            '/api/v1/accounts/12345/reports/some_type/1')
@@ -4,8 +4,9 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.sections import Sections
+from uw_canvas.sections import Sections, AsyncSections
 from uw_canvas.models import CanvasSection
+import asyncio
 import mock
 
 
@@ -115,3 +116,24 @@ class CanvasTestSections(TestCase):
                 'course_section': {
                     'name': 'New Name',
                     'sis_section_id': 'test-section-id'}})
+
+
+@fdao_canvas_override
+class CanvasTestAsyncSections(TestCase):
+    def test_sections(self):
+        canvas = AsyncSections()
+
+        sections = asyncio.run(canvas.get_sections_in_course_by_sis_id(
+            '2013-spring-CSE-142-A', {'include': ['students']}))
+
+        self.assertEqual(len(sections), 16, "Too few sections")
+
+    @mock.patch.object(Sections, '_put_resource')
+    def test_update_section(self, mock_update):
+        mock_update.return_value = None
+        canvas = AsyncSections()
+
+        asyncio.run(canvas.update_section("999999", "New Name", None))
+        mock_update.assert_called_with(
+            '/api/v1/sections/999999',
+            {'course_section': {'name': 'New Name'}})
@@ -0,0 +1,155 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from unittest import TestCase
+from uw_canvas.utilities import fdao_canvas_override
+from uw_canvas.sis_delta import SISImportState
+from uw_canvas.sis_import import SISImport
+from restclients_core.exceptions import DataFailureException
+from tempfile import TemporaryDirectory
+import mock
+import csv
+import os
+
+USERS_CSV = ('user_id,login_id,full_name,status\n'
+             'u1,l1,One,active\n'
+             'u2,l2,Two,active\n'
+             'u3,l3,Three,active\n')
+ENROLLMENTS_CSV = ('course_id,user_id,role\n'
+                   'c1,u1,student\n'
+                   'c1,u2,teacher\n')
+
+
+class CanvasTestSISDelta(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.feed = os.path.join(self.tmpdir.name, 'feed')
+        self.out = os.path.join(self.tmpdir.name, 'out')
+        os.mkdir(self.feed)
+        os.mkdir(self.out)
+        self.state = SISImportState(
+            os.path.join(self.tmpdir.name, 'state.sqlite3'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, filename, text):
+        with open(os.path.join(self.feed, filename), 'w') as f:
+            f.write(text)
+
+    def _pending(self):
+        return self.state._connection().execute(
+            "SELECT COUNT(*) FROM sis_row_pending").fetchone()[0]
+
+    def _read(self, filename):
+        with open(os.path.join(self.out, filename), newline='') as f:
+            return list(csv.reader(f))
+
+    def test_initial_diff(self):
+        self._write('users.csv', USERS_CSV)
+        self._write('enrollments.csv', ENROLLMENTS_CSV)
+
+        delta = self.state.diff(self.feed, self.out)
+        self.assertTrue(delta.has_changes())
+        self.assertEqual(delta.stats['users.csv'], {
+            'added': 3, 'changed': 0, 'deleted': 0, 'unchanged': 0})
+        self.assertEqual(self._read('enrollments.csv'), [
+            ['course_id', 'user_id', 'role', 'status'],
+            ['c1', 'u1', 'student', 'active'],
+            ['c1', 'u2', 'teacher', 'active']])
+        self.assertEqual(self.state.count(), 0)
+        self.assertEqual(self._pending(), 5)
+
+        delta.commit()
+        self.assertEqual(self.state.count(), 5)
+        self.assertEqual(self.state.count('users.csv'), 3)
+        self.assertEqual(self._pending(), 0)
+
+    def test_discard(self):
+        self._write('users.csv', USERS_CSV)
+        delta = self.state.diff(self.feed, self.out)
+        self.assertEqual(self._pending(), 3)
+
+        delta.discard()
+        self.assertEqual(self._pending(), 0)
+        self.assertEqual(self.state.count(), 0)
+
+    def test_delta(self):
+        self._write('users.csv', USERS_CSV)
+        self.state.diff(self.feed, self.out).commit()
+
+        self._write('users.csv', ('user_id,full_name,status,login_id\n'
+                                  'u1,One,active,l1\n'
+                                  'u3,Three,suspended,l3\n'
+                                  'u4,Four,active,l4\n'))
+        delta = self.state.diff(self.feed, self.out)
+        self.assertEqual(delta.stats['users.csv'], {
+            'added': 1, 'changed': 1, 'deleted': 1, 'unchanged': 1})
+        self.assertEqual(self._pending(), 3)
+        self.assertEqual(self._read('users.csv'), [
+            ['user_id', 'full_name', 'status', 'login_id'],
+            ['u3', 'Three', 'suspended', 'l3'],
+            ['u4', 'Four', 'active', 'l4'],
+            ['u2', 'Two', 'deleted', 'l2']])
+
+        delta.commit()
+        self.assertEqual(self.state.count(), 3)
+        delta = self.state.diff(self.feed, self.out)
+        self.assertFalse(delta.has_changes())
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'users.csv')))
+
+    def test_full_diff(self):
+        self._write('users.csv', USERS_CSV)
+        self.state.diff(self.feed, self.out).commit()
+
+        self._write('users.csv', USERS_CSV.replace('u3,l3,Three,active\n', ''))
+        delta = self.state.diff(self.feed, self.out, full=True)
+        self.assertEqual(delta.stats['users.csv'], {
+            'added': 0, 'changed': 0, 'deleted': 1, 'unchanged': 2})
+        self.assertEqual([row[0] for row in self._read('users.csv')],
+                         ['user_id', 'u1', 'u2', 'u3'])
+
+        self.state.clear('users.csv')
+        self.assertEqual(self.state.count(), 0)
+
+
+@fdao_canvas_override
+class CanvasTestSISImportDelta(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.state = SISImportState(
+            os.path.join(self.tmpdir.name, 'state.sqlite3'))
+        with open(os.path.join(self.tmpdir.name, 'users.csv'), 'w') as f:
+            f.write(USERS_CSV)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @mock.patch.object(SISImport, 'import_dir')
+    def test_import_delta(self, mock_import):
+        def import_dir(path, params):
+            self.assertEqual(os.listdir(path), ['users.csv'])
+            return 'import'
+
+        mock_import.side_effect = import_dir
+        canvas = SISImport()
+        sis_import, delta = canvas.import_delta(self.tmpdir.name, self.state)
+        self.assertEqual(sis_import, 'import')
+        delta.commit()
+
+        sis_import, delta = canvas.import_delta(self.tmpdir.name, self.state)
+        self.assertIsNone(sis_import)
+        self.assertEqual(mock_import.call_count, 1)
+
+        sis_import, delta = canvas.import_delta(
+            self.tmpdir.name, self.state, full=True)
+        self.assertEqual(sis_import, 'import')
+        self.assertEqual(mock_import.call_count, 2)
+
+        self.state.clear()
+        mock_import.side_effect = DataFailureException('/', 500, '')
+        self.assertRaises(DataFailureException, canvas.import_delta,
+                          self.tmpdir.name, self.state)
+        self.assertEqual(self.state._connection().execute(
+            "SELECT COUNT(*) FROM sis_row_pending").fetchone()[0], 0)
@@ -4,10 +4,16 @@
 
 from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.sis_import import SISImport
+from uw_canvas.sis_import import (
+    SISImport, SISImportPoller, SISImportTimeoutException)
 from uw_canvas.models import SISImport as SISImportModel
 from uw_canvas import MissingAccountID
+from tempfile import TemporaryDirectory, SpooledTemporaryFile
+from io import BytesIO, StringIO
+from pathlib import Path
+import zipfile
 import mock
+import os
 
 
 class CanvasTestSISImportMissingAccount(TestCase):
@@ -52,17 +58,109 @@ class CanvasTestSISImport(TestCase):
                 'Content-Type': 'application/zip'
             }, '')
 
+    @mock.patch.object(SISImport, '_post_resource')
+    def test_import_str_chunks(self, mock_post):
+        def rows():
+            yield 'user_id,login_id,status\n'
+            yield ''
+            yield b'u1,l1,active\n'
+
+        canvas = SISImport()
+        canvas.import_str(rows())
+        url, headers, body = mock_post.call_args[0]
+        self.assertEqual(headers, {'Content-Type': 'text/csv',
+                                   'Transfer-Encoding': 'chunked'})
+        self.assertEqual(list(body), [b'user_id,login_id,status\n',
+                                      b'u1,l1,active\n'])
+
+    @mock.patch.object(SISImport, '_post_resource')
+    def test_import_str_file(self, mock_post):
+        canvas = SISImport()
+        canvas.import_str(StringIO('a,b\n' * 3))
+        url, headers, body = mock_post.call_args[0]
+        self.assertEqual(headers['Transfer-Encoding'], 'chunked')
+        self.assertEqual(b''.join(body), b'a,b\n' * 3)
+
+        with mock.patch('uw_canvas.sis_import.UPLOAD_CHUNK_SIZE', 4):
+            stream = BytesIO(b'a,b\nc,d\ne')
+            stream.seek = mock.Mock(side_effect=OSError)
+            canvas.import_str(stream)
+            url, headers, body = mock_post.call_args[0]
+            self.assertEqual(list(body), [b'a,b\n', b'c,d\n', b'e'])
+
+    @mock.patch.object(SISImport, '_post_resource')
+    def test_import_archive_path(self, mock_post):
+        with TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'import.zip'
+            path.write_bytes(b'zipdata')
+
+            canvas = SISImport()
+            canvas.import_archive(path)
+            url, headers, body = mock_post.call_args[0]
+            self.assertEqual(headers, {'Content-Type': 'application/zip',
+                                       'Content-Length': '7'})
+            self.assertEqual(body.name, str(path))
+            self.assertTrue(body.closed)
+
     @mock.patch.object(SISImport, '_post_resource')
     @mock.patch.object(SISImport, '_build_archive')
     def test_import_dir(self, mock_build, mock_post):
-        mock_build.return_value = ''
+        archive = BytesIO(b'zip')
+        mock_build.return_value = archive
         canvas = SISImport()
         canvas.import_dir('/path/to/csv')
         mock_post.assert_called_with((
             '/api/v1/accounts/12345/sis_imports.json?'
             'import_type=instructure_csv'), {
-                'Content-Type': 'application/zip'
-            }, '')
+                'Content-Type': 'application/zip',
+                'Content-Length': '3'
+            }, archive)
+        self.assertTrue(archive.closed)
+
+    @mock.patch.object(SISImport, '_post_resource')
+    def test_import_dir_archive(self, mock_post):
+        with TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, 'users.csv'), 'w') as f:
+                f.write('user_id,login_id,status\nu1,l1,active\n')
+
+            def post(url, headers, body):
+                self.assertIsInstance(body, SpooledTemporaryFile)
+                self.assertEqual(int(headers['Content-Length']),
+                                 len(body.read()))
+                self.assertNotIn('Transfer-Encoding', headers)
+
+            mock_post.side_effect = post
+            SISImport().import_dir(tmpdir)
+            self.assertTrue(mock_post.called)
+
+        class Archive(object):
+            def __init__(self, data):
+                self._file = BytesIO(data)
+                self.read = self._file.read
+                self.tell = self._file.tell
+                self.seek = self._file.seek
+
+        mock_post.side_effect = None
+        SISImport().import_archive(Archive(b'zipdata'))
+        url, headers, body = mock_post.call_args[0]
+        self.assertEqual(headers['Content-Length'], '7')
+
+    def test_build_archive(self):
+        with TemporaryDirectory() as tmpdir:
+            for filename in ['users.csv', 'courses.csv', 'other.csv']:
+                with open(os.path.join(tmpdir, filename), 'w') as f:
+                    f.write('id\n{}\n'.format(filename))
+
+            with SISImport()._build_archive(tmpdir) as archive:
+                with zipfile.ZipFile(archive) as zf:
+                    self.assertEqual(zf.namelist(),
+                                     ['users.csv', 'courses.csv'])
+                    self.assertEqual(zf.read('users.csv'),
+                                     b'id\nusers.csv\n')
+                self.assertFalse(archive._rolled)
+
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['courses.csv', 'other.csv', 'users.csv'])
 
     def test_get_import_status(self):
         canvas = SISImport()
@@ -89,6 +187,142 @@ class CanvasTestSISImport(TestCase):
         self.assertEqual(sis_errors[0].row, 601)
         self.assertEqual(sis_errors[1].row, 580)
 
+    def test_diffing_params(self):
+        canvas = SISImport()
+        self.assertEqual(canvas.diffing_params(sis_term_id='2013-spring'), {
+            'diffing_data_set_identifier': 'account-12345-2013-spring'})
+        self.assertEqual(canvas.diffing_params(
+            'feed', drop_status='inactive', remaster=True, change_threshold=10,
+            params={'override_sis_stickiness': 1}), {
+                'diffing_data_set_identifier': 'feed',
+                'diffing_drop_status': 'inactive',
+                'diffing_remaster_data_set': 'true',
+                'change_threshold': 10,
+                'override_sis_stickiness': 1})
+        self.assertRaises(ValueError, canvas.diffing_params)
+        self.assertRaises(ValueError, canvas.diffing_params, 'feed',
+                          drop_status='gone')
+        self.assertRaises(ValueError, canvas.diffing_params, 'feed',
+                          change_threshold=0)
+
+    def test_batch_mode_params(self):
+        canvas = SISImport()
+        self.assertEqual(canvas.batch_mode_params(term_id=5), {
+            'batch_mode': 'true', 'batch_mode_term_id': 5})
+        self.assertEqual(canvas.batch_mode_params(
+            sis_term_id='2013-spring', change_threshold='20'), {
+                'batch_mode': 'true',
+                'batch_mode_term_id': 'sis_term_id:2013-spring',
+                'change_threshold': 20})
+        self.assertRaises(ValueError, canvas.batch_mode_params)
+        self.assertEqual(canvas.term_data_set_identifier(
+            '2013-spring', prefix='users'), 'users-2013-spring')
+
+    @mock.patch.object(SISImport, '_post_resource')
+    def test_import_diffing(self, mock_post):
+        canvas = SISImport()
+        canvas.import_str('a,b', params=canvas.batch_mode_params(
+            sis_term_id='2013-spring'))
+        self.assertEqual(mock_post.call_args[0][0], (
+            '/api/v1/accounts/12345/sis_imports.json?batch_mode=true&'
+            'batch_mode_term_id=sis_term_id%3A2013-spring&'
+            'import_type=instructure_csv'))
+
+    def test_diff_stats(self):
+        sis_import = SISImport().get_import_status(self._setup_sis_import())
+        self.assertTrue(sis_import.batch_mode)
+        self.assertEqual(sis_import.batch_mode_term_id, '1234')
+        self.assertTrue(sis_import.is_diffed())
+        self.assertEqual(sis_import.diff_stats(), {
+            'diffing_data_set_identifier': 'account-5-enrollments',
+            'diffed_against_import_id': 1,
+            'counts': {},
+            'statistics': {}})
+
+        sis_import = SISImportModel(data={
+            'id': 2, 'workflow_state': 'imported',
+            'override_sis_stickiness': False, 'clear_sis_stickiness': False,
+            'data': {'counts': {'users': 3, 'enrollments': 10}},
+            'statistics': {'Enrollment': {'created': 4, 'deleted': 1}}})
+        self.assertFalse(sis_import.is_diffed())
+        self.assertEqual(sis_import.diff_stats()['counts'],
+                         {'users': 3, 'enrollments': 10})
+        self.assertEqual(sis_import.diff_stats()['statistics'],
+                         {'Enrollment': {'created': 4, 'deleted': 1}})
+
+    def _sis_import(self, import_id, workflow_state, progress=0):
+        return SISImportModel(data={
+            'id': import_id, 'workflow_state': workflow_state,
+            'progress': progress, 'override_sis_stickiness': False,
+            'clear_sis_stickiness': False})
+
+    @mock.patch.object(SISImport, 'get_import_errors')
+    @mock.patch.object(SISImport, 'get_import_status')
+    def test_wait_for_imports(self, mock_status, mock_errors):
+        statuses = {
+            1: [self._sis_import(1, 'importing', 50),
+                self._sis_import(1, 'imported', 100)],
+            2: [self._sis_import(2, 'failed', 20)],
+        }
+        mock_status.side_effect = lambda i: statuses[i.import_id].pop(0)
+        mock_errors.return_value = ['error']
+        finished = []
+
+        sis_imports = SISImport().wait_for_imports([
+            self._sis_import(1, 'created'),
+            self._sis_import(2, 'importing', 10),
+            self._sis_import(3, 'aborted')], callback=finished.append)
+
+        self.assertEqual([i.workflow_state for i in sis_imports],
+                         ['imported', 'failed', 'aborted'])
+        self.assertEqual([i.import_id for i in finished], [3, 2, 1])
+        self.assertEqual(sis_imports[1].errors, ['error'])
+        self.assertEqual(sis_imports[0].errors, [])
+        mock_errors.assert_called_once_with(sis_imports[1])
+
+    @mock.patch.object(SISImport, 'get_import_status')
+    def test_wait_for_imports_timeout(self, mock_status):
+        mock_status.side_effect = lambda i: self._sis_import(1, 'importing')
+        with self.assertRaises(SISImportTimeoutException) as cm:
+            SISImport().wait_for_imports(
+                [self._sis_import(1, 'created')], timeout=0.01)
+        self.assertEqual(cm.exception.sis_imports[0].import_id, 1)
+        self.assertEqual(str(cm.exception),
+                         'Timed out waiting for SIS imports 1')
+
+    @mock.patch('uw_canvas.poller.time.time')
+    def test_poller(self, mock_time):
+        mock_time.return_value = 100
+        poller = SISImportPoller([self._sis_import(1, 'importing', 10)])
+        poller.min_interval = 5
+        self.assertEqual(poller.due(), [])
+        self.assertAlmostEqual(poller.next_delay(), 0.001)
+
+        mock_time.return_value = 110
+        self.assertFalse(poller.update(0, self._sis_import(1, 'importing',
+                                                           30)))
+        self.assertEqual(poller.next_delay(), 35)
+
+        mock_time.return_value = 145
+        self.assertFalse(poller.update(0, self._sis_import(1, 'importing',
+                                                           30)))
+        self.assertEqual(poller.next_delay(), 60)
+        self.assertEqual(len(poller.running()), 1)
+
+        self.assertTrue(poller.update(0, self._sis_import(1, 'imported')))
+        self.assertTrue(poller.is_done())
+
+    @mock.patch('uw_canvas.poller.settings')
+    def test_poller_settings(self, mock_settings):
+        mock_settings.CANVAS_SIS_IMPORT_POLLING_INTERVAL = 2
+        mock_settings.CANVAS_SIS_IMPORT_POLLING_MAX_INTERVAL = 30
+        mock_settings.CANVAS_SIS_IMPORT_POLLING_BACKOFF = 3
+        poller = SISImportPoller([self._sis_import(1, 'imported')])
+        self.assertEqual(poller.min_interval, 2)
+        self.assertEqual(poller.max_interval, 30)
+        self.assertEqual(poller.backoff, 3)
+        self.assertTrue(poller.is_done())
+
     def _setup_sis_import(self):
         return SISImportModel(import_id=1)
 
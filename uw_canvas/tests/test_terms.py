@@ -6,6 +6,8 @@ from unittest import TestCase
 from uw_canvas.utilities import fdao_canvas_override
 from uw_canvas.terms import Terms
 from uw_canvas import MissingAccountID
+from restclients_core.exceptions import DataFailureException
+from datetime import datetime
 import mock
 
 
@@ -52,3 +54,72 @@ class CanvasTestTerms(TestCase):
                     'overrides': {'StudentEnrollment': {
                         'start_at': '2013-01-07T08:00:00-05:00',
                         'end_at': '2013-05-14T05:00:00-04:0'}}}})
+
+
+@fdao_canvas_override
+class CanvasTestTermIndex(TestCase):
+    def setUp(self):
+        Terms._term_indexes = {}
+
+    @mock.patch.object(Terms, 'get_all_terms')
+    def test_get_term_by_sis_id_cold(self, mock_all):
+        canvas = Terms()
+        term = canvas.get_term_by_sis_id("2013-summer")
+        self.assertEqual(term.term_id, 3845)
+        self.assertFalse(mock_all.called)
+
+        self.assertIsNone(canvas.get_term_by_sis_id("2099-summer"))
+
+    @mock.patch.object(Terms, '_get_resource')
+    def test_get_term_by_sis_id_indexed(self, mock_get):
+        canvas = Terms()
+        canvas.get_all_terms()
+
+        term = canvas.get_term_by_sis_id("2013-summer")
+        self.assertEqual(term.term_id, 3845)
+        self.assertFalse(mock_get.called)
+
+        mock_get.return_value = {'id': 9999, 'sis_term_id': '2099-summer',
+                                 'name': 'Summer 2099'}
+        term = canvas.get_term_by_sis_id("2099-summer")
+        self.assertEqual(term.term_id, 9999)
+        mock_get.assert_called_once_with(
+            '/api/v1/accounts/12345/terms/sis_term_id%3A2099-summer')
+
+        mock_get.side_effect = DataFailureException(
+            '/api/v1/accounts/12345/terms/sis_term_id%3A2099-autumn', 404, '')
+        self.assertIsNone(canvas.get_term_by_sis_id("2099-autumn"))
+
+    def test_get_term_by_id(self):
+        canvas = Terms()
+        self.assertEqual(canvas.get_term_by_id(3845).sis_term_id,
+                         "2013-summer")
+        self.assertEqual(canvas.get_term_by_id("738").name,
+                         "Default Term")
+        self.assertIsNone(canvas.get_term_by_id(1))
+
+    def test_get_term_for_date(self):
+        canvas = Terms()
+        term = canvas.get_term_for_date(datetime(2012, 7, 1))
+        self.assertEqual(term.term_id, 2374)
+
+        term = canvas.get_term_for_date(datetime(2013, 7, 1))
+        self.assertEqual(term.term_id, 3845)
+
+        term = canvas.get_term_for_date(datetime(2013, 9, 1))
+        self.assertEqual(term.term_id, 3842)
+
+        self.assertIsNone(canvas.get_term_for_date(datetime(2012, 9, 1)))
+        self.assertIsNone(canvas.get_term_for_date(datetime(2010, 1, 1)))
+        self.assertIsNone(canvas.get_term_for_date(datetime(2016, 1, 1)))
+
+    @mock.patch.object(Terms, '_term_index_ttl', return_value=60)
+    @mock.patch('uw_canvas.terms.time.time')
+    def test_index_expiry(self, mock_time, mock_ttl):
+        mock_time.return_value = 100
+        canvas = Terms()
+        index = canvas.get_term_index()
+        self.assertIs(canvas.get_term_index(), index)
+
+        mock_time.return_value = 161
+        self.assertIsNot(canvas.get_term_index(), index)
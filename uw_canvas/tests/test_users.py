@@ -5,10 +5,12 @@
 from unittest import TestCase
 from commonconf import override_settings
 from uw_canvas.utilities import fdao_canvas_override
-from uw_canvas.users import Users
+from uw_canvas.users import Users, AsyncUsers
 from uw_canvas.models import CanvasUser
 from uw_canvas import MissingAccountID
+from restclients_core.exceptions import DataFailureException
 from datetime import datetime
+import asyncio
 import mock
 
 
@@ -70,6 +72,18 @@ class CanvasTestUsers(TestCase):
             '/api/v1/users/sis_user_id%3ADEB35E0A465242CF9C5CDBC108050EC0',
             params={'include': 'last_login'})
 
+    def test_get_users_by_sis_ids(self):
+        canvas = Users()
+        users = canvas.get_users_by_sis_ids([
+            "DEB35E0A465242CF9C5CDBC108050EC0", "00000000000000000000000000",
+            "DEB35E0A465242CF9C5CDBC108050EC0"])
+
+        self.assertEqual(len(users), 3)
+        self.assertEqual(users[0].user_id, 188885, "Has correct user id")
+        self.assertIsInstance(users[1], DataFailureException)
+        self.assertEqual(users[1].status, 404)
+        self.assertIs(users[2], users[0])
+
     def test_json_data(self):
         canvas = Users()
         user = canvas.get_user(188885)
@@ -171,6 +185,15 @@ class CanvasTestUsers(TestCase):
         self.assertEqual(
             enrollment.base_role_type, "DesignerEnrollment", "Base Role Type")
 
+    def test_iter_users_for_course_id(self):
+        canvas = Users()
+
+        users = list(canvas.iter_users_for_course("862539", params={
+            "search_term": "jav", "include": ["enrollments"]}))
+
+        self.assertEqual(len(users), 3, "Found 3 canvas users")
+        self.assertEqual(users[0].login_id, "javerage", "Login ID")
+
     def test_get_logins(self):
         canvas = Users()
 
@@ -307,3 +330,15 @@ class CanvasTestUsers(TestCase):
             '/api/v1/users/sis_login_id%3Ajaverage/page_views?'
             'end_time=2017-01-01T00%3A00%3A00&'
             'start_time=2015-01-01T00%3A00%3A00', True, None)
+
+
+@fdao_canvas_override
+class CanvasTestAsyncUsers(TestCase):
+    def test_get_users_for_course_id(self):
+        canvas = AsyncUsers()
+
+        users = asyncio.run(canvas.get_users_for_course("862539", params={
+            "search_term": "jav", "include": ["enrollments"]}))
+
+        self.assertEqual(len(users), 3, "Found 3 canvas users")
+        self.assertEqual(users[0].login_id, "javerage", "Login ID")
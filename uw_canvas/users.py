@@ -2,7 +2,8 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from uw_canvas import Canvas, MissingAccountID
+from uw_canvas import (
+    Canvas, AsyncCanvas, async_method, MissingAccountID, DEFAULT_BATCH_WORKERS)
 from uw_canvas.accounts import ACCOUNTS_API
 from uw_canvas.courses import COURSES_API
 from uw_canvas.models import CanvasUser, Login
@@ -29,6 +30,24 @@ class Users(Canvas):
         return self.get_user(self._sis_id(sis_user_id, sis_field="user"),
                              params)
 
+    def get_users(self, user_ids, params={},
+                  max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Returns a list of user details for the passed user ids, in the same
+        order.  A DataFailureException for a user is returned in place of
+        that user.
+        """
+        return self._get_batch(self.get_user, user_ids, params,
+                               max_workers=max_workers)
+
+    def get_users_by_sis_ids(self, sis_user_ids, params={},
+                             max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Returns a list of user details for the passed user sis ids.
+        """
+        return self._get_batch(self.get_user_by_sis_id, sis_user_ids, params,
+                               max_workers=max_workers)
+
     def get_users_for_course(self, course_id, params={}):
         """
         Returns a list of users for the given course id.
@@ -47,6 +66,22 @@ class Users(Canvas):
         return self.get_users_for_course(
             self._sis_id(sis_course_id, sis_field="course"), params)
 
+    def iter_users_for_course(self, course_id, params={}):
+        """
+        Return an iterator over the users for the given course id, fetching
+        pages as they are consumed.
+        """
+        url = COURSES_API.format(course_id) + "/users"
+        for datum in self._iter_paged_resource(url, params=params):
+            yield CanvasUser(data=datum)
+
+    def iter_users_for_sis_course_id(self, sis_course_id, params={}):
+        """
+        Return an iterator over the users for the given sis course id.
+        """
+        return self.iter_users_for_course(
+            self._sis_id(sis_course_id, sis_field="course"), params)
+
     def create_user(self, user, account_id=None):
         """
         Create and return a new user and pseudonym for an account.
@@ -143,3 +178,18 @@ class Users(Canvas):
     def terminate_user_sessions(self, user_id):
         url = USERS_API.format(user_id) + "/sessions"
         return self._delete_resource(url)
+
+
+class AsyncUsers(AsyncCanvas):
+    """
+    Coroutine versions of the Users methods.
+    """
+    _sync_class = Users
+
+    get_user = async_method(Users.get_user)
+    get_user_by_sis_id = async_method(Users.get_user_by_sis_id)
+    get_users_for_course = async_method(Users.get_users_for_course)
+    get_users_for_sis_course_id = async_method(
+        Users.get_users_for_sis_course_id)
+    create_user = async_method(Users.create_user)
+    get_user_logins = async_method(Users.get_user_logins)